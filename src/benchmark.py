@@ -0,0 +1,332 @@
+__doc__ = """
+Benchmark the connect four board and AI search.
+
+Every benchmark runs on the same fixed corpus of reference positions, so the
+JSON results of two runs, e.g. on two commits, can be compared.
+
+Usage:
+  benchmark.py [--output=FILE] [--repeat=N] [--difficulties=DIFFICULTIES]
+               [--time-limit=TIMEINSECONDS] [--search-modes=MODES]
+  benchmark.py compare <baseline> <current> [--threshold=PERCENT]
+  benchmark.py (-h | --help)
+
+Options:
+  -h --help                     Show this screen.
+  --output=FILE                 Save the results as JSON into FILE.
+  --repeat=N                    Runs of every benchmark, the best one is kept [default: 5].
+  --difficulties=DIFFICULTIES   Comma separated AI difficulties to search with [default: EASY,NORMAL,HARD].
+  --time-limit=TIMEINSECONDS    Time limit of every AI search, only reached by PERFECT [default: 60].
+  --search-modes=MODES          Comma separated searches of the AI, compared by nodes to alphabeta [default: alphabeta,pvs].
+  --threshold=PERCENT           Slowdown from which a benchmark is reported as a regression [default: 10].
+"""
+
+
+from sys import exit
+import contextlib
+import datetime
+import io
+import platform
+import timeit
+import tracemalloc
+
+from colorama import Fore
+from docopt import docopt
+from loguru import logger
+import ujson as json
+
+from game.agents import Difficulty, MiniMaxPlayer, Player, SearchMode
+from game.board import ConnectFourBoard
+from game.evaluation import batch_utility, utility
+
+# move sequences, columns counted from 1; none of them is won or can be won at once
+CORPUS = {
+    "opening": ["", "44", "7242", "262763"],
+    "midgame": [
+        "776775634527",
+        "64417636133337",
+        "6114366454364275",
+        "367263761535231232",
+    ],
+    "endgame": [
+        "6247167412115343611737536542",
+        "115751141271355234245335373667",
+        "53662473553342551654737267624434",
+        "3163244677214773126252461431354667",
+    ],
+}
+
+# HARD deepens until the time limit runs out, it is benchmarked at a fixed depth
+# so that runs stay comparable
+FIXED_DEPTHS = {Difficulty.HARD: 7}
+
+BOARD_OPERATIONS = (
+    "make_undo_move",
+    "is_valid",
+    "is_finished",
+    "streak",
+    "copy",
+    "utility",
+    "batch_utility",
+)
+
+
+def load_position(moves, player1, player2):
+
+    connect4_board = ConnectFourBoard(player1=player1, player2=player2)
+    for move in moves:
+        connect4_board.make_move(int(move))
+        connect4_board.toggle_players()
+
+    return connect4_board
+
+
+def benchmark_board(repeat):
+    """Times the board operations over the whole corpus
+
+    Returns:
+        dict -- {"board.<operation>": {"ns_per_op": nanoseconds}}
+    """
+
+    player1, player2 = Player(no=1), Player(no=2)
+    boards = [
+        load_position(moves, player1, player2)
+        for positions in CORPUS.values()
+        for moves in positions
+    ]
+
+    def make_undo_move():
+        for connect4_board in boards:
+            for move in range(1, 8):
+                if connect4_board.is_valid(move):
+                    connect4_board.make_move(move)
+                    connect4_board.undo_move()
+
+    def is_valid():
+        for connect4_board in boards:
+            for move in range(1, 8):
+                connect4_board.is_valid(move)
+
+    def is_finished():
+        for connect4_board in boards:
+            connect4_board.is_finished()
+
+    def streak():
+        for connect4_board in boards:
+            for length in (2, 3, 4):
+                connect4_board.streak(1, length)
+
+    def copy():
+        for connect4_board in boards:
+            connect4_board.copy()
+
+    # utilities of player 1, one position at a time and the whole stack at once
+    discs = []
+    for connect4_board in boards:
+        bitboard = connect4_board.bitboard
+        if bitboard.player_no == 1:
+            discs.append((bitboard.position, bitboard.position ^ bitboard.mask))
+        else:
+            discs.append((bitboard.position ^ bitboard.mask, bitboard.position))
+    grids = [connect4_board.current_grid_state for connect4_board in boards]
+
+    def scalar_utility():
+        for own, enemy in discs:
+            utility(own, enemy)
+
+    def stacked_utility():
+        batch_utility(grids, 1)
+
+    operations = {
+        "make_undo_move": (
+            make_undo_move,
+            sum(b.is_valid(m) for b in boards for m in range(1, 8)),
+        ),
+        "is_valid": (is_valid, len(boards) * 7),
+        "is_finished": (is_finished, len(boards)),
+        "streak": (streak, len(boards) * 3),
+        "copy": (copy, len(boards)),
+        "utility": (scalar_utility, len(boards)),
+        "batch_utility": (stacked_utility, len(boards)),
+    }
+
+    results = {}
+    for name in BOARD_OPERATIONS:
+        function, operations_per_call = operations[name]
+        number = 200
+        best = min(timeit.repeat(function, number=number, repeat=repeat))
+        results["board.{}".format(name)] = {
+            "ns_per_op": best / (number * operations_per_call) * 1e9
+        }
+
+    return results
+
+
+def benchmark_search(difficulties, time_limit, search_modes, repeat):
+    """Searches every corpus position with a fresh AI of every difficulty and mode
+
+    Results of SearchMode.ALPHABETA keep the names they had before search modes,
+    the others are suffixed with their mode and count their nodes relative to
+    SearchMode.ALPHABETA's, when both were searched.
+    Every position is searched `repeat` times and its fastest search is kept.
+
+    Returns:
+        dict -- {"search.<difficulty>.<stage>[.<mode>]": {"seconds", "nodes",
+                "nodes_per_sec", "peak_memory"[, "nodes_vs_alphabeta"]}}
+    """
+
+    results = {}
+
+    for difficulty in difficulties:
+        for search_mode in search_modes:
+            for stage, positions in CORPUS.items():
+                seconds = 0.0
+                nodes = 0
+                peak_memory = 0
+
+                for moves in positions:
+                    times = []
+
+                    # every run searches with a fresh AI, the fastest is kept
+                    for traced in [False] * repeat + [True]:
+                        no = 1 if len(moves) % 2 == 0 else 2
+                        player = MiniMaxPlayer(
+                            no=no,
+                            time_limit=time_limit,
+                            difficulty=difficulty,
+                            search_mode=search_mode,
+                            depth=FIXED_DEPTHS.get(difficulty),
+                        )
+                        opponent = Player(no=3 - no)
+                        if no == 1:
+                            connect4_board = load_position(moves, player, opponent)
+                        else:
+                            connect4_board = load_position(moves, opponent, player)
+
+                        # memory is traced in a run of its own, tracing slows it down
+                        if traced:
+                            tracemalloc.start()
+                            player.search(connect4_board)
+                            peak_memory = max(
+                                peak_memory, tracemalloc.get_traced_memory()[1]
+                            )
+                            tracemalloc.stop()
+                        else:
+                            start = timeit.default_timer()
+                            player.search(connect4_board)
+                            times.append(timeit.default_timer() - start)
+                            searched = player.nodes
+                            if player.solver is not None:
+                                searched += player.solver.nodes
+
+                    seconds += min(times)
+                    nodes += searched
+
+                name = "search.{}.{}".format(difficulty.value, stage)
+                result = {
+                    "seconds": seconds,
+                    "nodes": nodes,
+                    "nodes_per_sec": nodes / seconds if seconds else 0.0,
+                    "peak_memory": peak_memory,
+                }
+                if search_mode is not SearchMode.ALPHABETA:
+                    baseline = results.get(name)
+                    if baseline is not None and baseline["nodes"]:
+                        result["nodes_vs_alphabeta"] = nodes / baseline["nodes"]
+                    name = "{}.{}".format(name, search_mode.value)
+                results[name] = result
+
+    return results
+
+
+def compare(baseline, current, threshold):
+    """Lists the benchmarks of `current` that are more than `threshold` percent slower
+
+    Returns:
+        list -- (name, baseline value, current value, change in percent)
+    """
+
+    regressions = []
+
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        metric = "ns_per_op" if "ns_per_op" in result else "seconds"
+        before = baseline["results"][name][metric]
+        after = result[metric]
+        if before > 0:
+            change = (after - before) / before * 100
+            if change > threshold:
+                regressions.append((name, before, after, change))
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    args = docopt(__doc__)
+
+    logger.remove(0)
+
+    if args["compare"]:
+
+        with open(args["<baseline>"]) as baseline_file:
+            baseline = json.load(baseline_file)
+        with open(args["<current>"]) as current_file:
+            current = json.load(current_file)
+
+        regressions = compare(baseline, current, float(args["--threshold"]))
+        for name, before, after, change in regressions:
+            print(
+                Fore.RED
+                + "{}: {:.4g} -> {:.4g} (+{:.1f}%)".format(name, before, after, change)
+                + Fore.RESET
+            )
+        if regressions:
+            exit(1)
+        print(Fore.GREEN + "No regressions." + Fore.RESET)
+
+    else:
+
+        try:
+            repeat = int(args["--repeat"])
+            time_limit = int(args["--time-limit"])
+            difficulties = [
+                Difficulty(difficulty)
+                for difficulty in args["--difficulties"].split(",")
+            ]
+            search_modes = [
+                SearchMode(search_mode)
+                for search_mode in args["--search-modes"].split(",")
+            ]
+        except:
+            exit(__doc__)
+
+        results = benchmark_board(repeat)
+        # keep the AIs from printing their logs
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.update(
+                benchmark_search(difficulties, time_limit, search_modes, repeat)
+            )
+
+        for name, result in results.items():
+            print(
+                "{:<28} {}".format(
+                    name,
+                    ", ".join(
+                        "{}: {:.6g}".format(metric, value)
+                        for metric, value in result.items()
+                    ),
+                )
+            )
+
+        if args["--output"] is not None:
+            with open(args["--output"], "w") as output_file:
+                json.dump(
+                    {
+                        "date": datetime.datetime.now().isoformat(),
+                        "python": platform.python_version(),
+                        "results": results,
+                    },
+                    output_file,
+                    indent=2,
+                )
@@ -1,10 +1,15 @@
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 from random import choice, randint
 from sys import exit
 import datetime
-import pickle
+import multiprocessing
+import os
+import threading
 
 from colorama import Fore
+from gevent.event import Event
+from gevent.queue import Empty, Queue
 from gevent.server import DatagramServer
 from loguru import logger
 from prompt_toolkit import PromptSession
@@ -13,19 +18,30 @@ from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
 from prompt_toolkit.completion import WordCompleter
 from prompt_toolkit.formatted_text import ANSI
 from prompt_toolkit.history import InMemoryHistory
-from tinydb import TinyDB
-from tinydb.middlewares import CachingMiddleware
-from tinydb.storages import JSONStorage
 import gevent
 import numpy as np
 import ujson as json
 
+from game import wire
+from game.bitboard import H1, HEIGHT, WIDTH, BitBoard
+from game.board import ConnectFourBoard
+from game.book import OpeningBook
+from game.endgame import WIN_UTIL, EndgameDatabase
+from game.evaluation import STREAK_3, utility
+from game.mcts import MonteCarloTreeSearch
+from game.ordering import MoveOrdering, format_ordering, parse_ordering
+from game.savefile import save_game
+from game.solver import Solver, SolverTimeout
+from game.stats import SearchStats
+from game.transposition import Bound, TranspositionTable
+
 
 class Agents(Enum):
 
     HumanPlayer = "HUMANPLAYER"
     NetworkPlayer = "NETWORKPLAYER"
     MiniMaxPlayer = "MINIMAXPLAYER"
+    MCTSPlayer = "MCTSPLAYER"
 
 
 class Difficulty(Enum):
@@ -33,6 +49,34 @@ class Difficulty(Enum):
     EASY = "EASY"
     NORMAL = "NORMAL"
     HARD = "HARD"
+    PERFECT = "PERFECT"
+
+
+class SearchMode(Enum):
+
+    ALPHABETA = "alphabeta"
+    PVS = "pvs"
+
+
+# half the width of an aspiration window, around a three in a row's worth
+ASPIRATION_WINDOW = STREAK_3
+
+# nodes searched between two looks at the clock
+TIMEOUT_CHECK_NODES = 1024
+
+# playouts of every MCTSPlayer move by difficulty, None to search for the whole
+# time limit
+MCTS_ITERATIONS = {
+    Difficulty.EASY: 1000,
+    Difficulty.NORMAL: 5000,
+    Difficulty.HARD: 25000,
+    Difficulty.PERFECT: None,
+}
+
+
+class SearchTimeout(Exception):
+
+    pass
 
 
 class Player(object):
@@ -55,6 +99,12 @@ class Player(object):
         else:
             self.color = color
 
+    def config(self):
+
+        """The settings a player is rebuilt from by `player_from_config`"""
+
+        return {"no": self.no, "time_limit": self.time_limit}
+
     def next_move(self, connect4_board):
 
         raise NotImplementedError
@@ -65,91 +115,632 @@ class Player(object):
 
 
 class MiniMaxPlayer(Player):
-    def __init__(self, difficulty=Difficulty.NORMAL, *args, **kwargs):
+    def __init__(
+        self,
+        difficulty=Difficulty.NORMAL,
+        tt_size=250000,
+        solver_size=250000,
+        book=None,
+        threads=1,
+        stats=False,
+        stats_file=None,
+        stats_format="json",
+        ordering=None,
+        ponder=False,
+        incremental=True,
+        endgame=None,
+        search_mode=SearchMode.ALPHABETA,
+        depth=None,
+        *args,
+        **kwargs
+    ):
 
         super(MiniMaxPlayer, self).__init__(*args, **kwargs)
 
+        self.difficulty = difficulty
+        self.tt_size = tt_size
+        self.transposition_table = TranspositionTable(max_entries=tt_size)
+        self.solver_size = solver_size
+
+        # worker processes are only started by the first parallel search
+        self.threads = threads
+        self._executor = None
+        self._shared_alpha = None
+
+        if isinstance(book, str):
+            book = OpeningBook(book)
+        self.book = book
+
+        # exact results of the positions near the end of the game, probed at
+        # every node deep enough into the game
+        if isinstance(endgame, str):
+            endgame = EndgameDatabase(endgame)
+        self.endgame = endgame
+
+        # search statistics are only kept when asked for, they cost time
+        self.stats = SearchStats() if stats or stats_file is not None else None
+        self.stats_file = stats_file
+        self.stats_format = stats_format
+
+        self.ordering = MoveOrdering() if ordering is None else ordering
+
+        # searches on the opponent's time, see _start_pondering
+        self.ponder = ponder
+        self._ponder_thread = None
+
+        # keeps the streak counts of the searched board up to date move by move
+        # rather than counting them at every leaf, see StreakCounts
+        self.incremental = incremental
+
+        # principal variation search and aspiration windows, see _minimax and
+        # _aspiration_search
+        self.search_mode = search_mode
+
+        # the weak difficulties stop at a fixed depth, the strong ones deepen
+        # until the time limit runs out, so the time limit sets their strength
+        self.solver = None
         if difficulty == Difficulty.EASY:
             self.depth = 3
         elif difficulty == Difficulty.NORMAL:
             self.depth = 5
         elif difficulty == Difficulty.HARD:
-            self.depth = 7
+            self.depth = None
+        elif difficulty == Difficulty.PERFECT:
+            self.depth = None  # only used when the solver runs out of time
+            self.solver = Solver(max_entries=solver_size)
+        # a fixed depth for any difficulty, e.g. for reproducible benchmarks
+        if depth is not None:
+            self.depth = depth
 
         if self.no == 1:
             self.current_depth = 0
         elif self.no == 2:
             self.current_depth = 1
 
+    def config(self):
+
+        config = super(MiniMaxPlayer, self).config()
+        config.update(
+            {
+                "type": Agents.MiniMaxPlayer.value,
+                "difficulty": self.difficulty.value,
+                "tt_size": self.tt_size,
+                "solver_size": self.solver_size,
+                "book": self.book.path if self.book is not None else None,
+                "threads": self.threads,
+                "stats": self.stats is not None,
+                "stats_file": self.stats_file,
+                "stats_format": self.stats_format,
+                "ordering": format_ordering(self.ordering),
+                "ponder": self.ponder,
+                "incremental": self.incremental,
+                "endgame": self.endgame.path if self.endgame is not None else None,
+                "search_mode": self.search_mode.value,
+                "depth": self.depth,
+            }
+        )
+        return config
+
     def next_move(self, connect4_board):
 
+        self._stop_pondering()
+
         connect4_board.print_board()
-        self.max_depth = 0
-        self.branching_factors = []
-        self.leaves = []
-        self.cut_offs = []
-        self.move_time_limit = datetime.datetime.now() + datetime.timedelta(
-            seconds=self.time_limit - 1
-        )
-        move, _ = self._minimax(
-            connect4_board=connect4_board, alpha=float("-inf"), beta=float("inf")
-        )
+        move, _ = self.search(connect4_board=connect4_board)
         connect4_board.delete_board_from_stdout()
 
         logger.bind(verbose=True).debug(
             "Max depth: {}".format(self.current_depth + self.max_depth)
         )
         logger.bind(verbose=True).debug(
-            "Avr. branching factor: {}".format(
-                np.mean(np.array(self.branching_factors, dtype=int))
-            )
+            "{} nodes searched with {}".format(self.nodes, self.search_mode.value)
         )
+        if self.stats is not None:
+            self._log_stats()
         logger.bind(verbose=True).debug(
-            "{} leaves explored with utils: {}".format(
-                len(self.leaves), ", ".join([str(item) for item in self.leaves])
+            "Transposition table: {} entries, {} hits, {} misses, {} evictions".format(
+                len(self.transposition_table),
+                self.transposition_table.hits,
+                self.transposition_table.misses,
+                self.transposition_table.evictions,
             )
         )
         logger.bind(verbose=True).debug(
-            "{} cutoffs - (depth, count): {}".format(
-                len(self.cut_offs),
+            "AI {}'ve played into column {}.".format(self.no, move)
+        )
+
+        self.transposition_table.reset_counters()
+        self.current_depth += 2
+
+        if self.ponder:
+            self._start_pondering(connect4_board, move)
+
+        return move
+
+    def _start_pondering(self, connect4_board, move):
+
+        """Keeps searching in a background thread until it is our turn again
+
+        The thread plays `move` on a copy of the board and searches our answers
+        to the opponent's replies, the one our search expects first. Its results
+        stay in the transposition table, so when the opponent plays a reply that
+        was searched to full depth, the search of our next move is answered by
+        the table at once. Pondering always searches in this process, so it can
+        be stopped within a few milliseconds.
+        """
+
+        connect4_board = connect4_board.copy()
+        connect4_board.make_move(move)
+        connect4_board.toggle_players()
+
+        self.nodes = 0
+        self._next_check = TIMEOUT_CHECK_NODES
+        self.move_time_limit = datetime.datetime.max
+        self._ponder_thread = threading.Thread(
+            target=self._ponder, args=(connect4_board,), daemon=True
+        )
+        self._ponder_thread.start()
+
+    def _ponder(self, connect4_board):
+
+        bitboard = connect4_board.bitboard
+        if connect4_board.is_finished() or connect4_board.is_full():
+            return
+
+        entry = self.transposition_table.peek(*bitboard.canonical_key())
+        replies = self.ordering.order(bitboard, 0, None if entry is None else entry[3])
+
+        for reply in replies:
+            if datetime.datetime.now() > self.move_time_limit:
+                break
+
+            connect4_board.make_move(reply)
+            connect4_board.toggle_players()
+            if not connect4_board.is_finished() and not connect4_board.is_full():
+                self._iterative_deepening(connect4_board, parallel=False)
+            connect4_board.toggle_players()
+            connect4_board.undo_move()
+
+    def _stop_pondering(self):
+
+        if self._ponder_thread is None:
+            return
+
+        # makes the pondering search time out at its next time check
+        self.move_time_limit = datetime.datetime.min
+        self._ponder_thread.join()
+        self._ponder_thread = None
+
+        logger.bind(verbose=True).debug(
+            "{} nodes searched on the opponent's time".format(self.nodes)
+        )
+
+    def _log_stats(self):
+
+        logger.bind(verbose=True).debug(
+            "Avr. branching factor: {:.2f}".format(self.stats.branching_factor())
+        )
+        logger.bind(verbose=True).debug(
+            "{} leaves explored, {} cutoffs - (depth, count): {}".format(
+                self.stats.total("leaves"),
+                self.stats.total("cutoffs"),
                 ", ".join(
-                    [
-                        str(item)
-                        for item in [
-                            (level + self.current_depth, self.cut_offs.count(level))
-                            for level in set(self.cut_offs)
-                        ]
-                    ]
+                    str((depth + self.current_depth, count))
+                    for depth, count in enumerate(self.stats.cutoffs)
+                    if count
                 ),
             )
         )
+        if self.search_mode is SearchMode.PVS:
+            logger.bind(verbose=True).debug(
+                "{} null window searches re-searched".format(
+                    self.stats.total("researches")
+                )
+            )
+        cutoffs = sum(self.ordering.cutoff_ranks)
         logger.bind(verbose=True).debug(
-            "AI {}'ve played into column {}.".format(self.no, move)
+            "Cutoffs by rank of the move causing them: {}".format(
+                ", ".join(
+                    "{}: {:.1%}".format(rank + 1, count / cutoffs)
+                    for rank, count in enumerate(self.ordering.cutoff_ranks)
+                    if count
+                )
+            )
         )
 
-        self.current_depth += 2
+        if self.stats_file is None:
+            return
 
-        return move
+        # json stats are appended one line per move, prometheus ones replaced
+        if self.stats_format == "prometheus":
+            with open(self.stats_file, "w") as stats_file:
+                stats_file.write(self.stats.to_prometheus(labels={"player": self.no}))
+        else:
+            with open(self.stats_file, "a") as stats_file:
+                stats_file.write(
+                    self.stats.to_json(
+                        labels={"player": self.no, "ply": self.current_depth}
+                    )
+                    + "\n"
+                )
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_shared_alpha"] = None
+        state["_ponder_thread"] = None
+        return state
+
+    def search(self, connect4_board):
+
+        """Picks a move for the current player of the board without printing anything
+
+        Returns:
+            tuple -- (column counted from 1, its util)
+        """
+
+        self._reset_counters()
+        self.move_time_limit = datetime.datetime.now() + datetime.timedelta(
+            seconds=self.time_limit - 1
+        )
+
+        if self.stats is None:
+            return self._search(connect4_board)
+
+        self.stats.start()
+        try:
+            return self._search(connect4_board)
+        finally:
+            self.stats.stop()
+
+    def _search(self, connect4_board):
+
+        if self.book is not None:
+            entry = self.book.lookup(*connect4_board.bitboard.canonical_key())
+            if entry is not None and connect4_board.is_valid(entry[0]):
+                logger.bind(verbose=True).debug(
+                    "Opening book move: column {} with util {}".format(*entry)
+                )
+                return entry
+
+        if self.endgame is not None:
+            entry = self._probe_endgame(connect4_board.bitboard)
+            if entry is not None:
+                logger.bind(verbose=True).debug(
+                    "Endgame database move: column {} with score {}".format(*entry)
+                )
+                return entry
+
+        if self.solver is not None:
+            # the solver gets half of the time, the heuristic search the rest
+            deadline = datetime.datetime.now() + datetime.timedelta(
+                seconds=(self.time_limit - 1) / 2
+            )
+            try:
+                move, score = self.solver.best_move(
+                    connect4_board.bitboard, deadline=deadline
+                )
+                logger.bind(verbose=True).debug(
+                    "Solved: column {} with score {} in {} nodes".format(
+                        move, score, self.solver.nodes
+                    )
+                )
+                return move, score
+            except SolverTimeout:
+                logger.bind(verbose=True).debug(
+                    "Solver ran out of time after {} nodes, searching heuristically".format(
+                        self.solver.nodes
+                    )
+                )
+
+        return self._iterative_deepening(connect4_board=connect4_board)
+
+    def _reset_counters(self):
+
+        self.max_depth = 0
+        self.nodes = 0
+        self._next_check = TIMEOUT_CHECK_NODES
+        self.ordering.new_search()
+        if self.stats is not None:
+            self.stats.reset()
+        if self.solver is not None:
+            self.solver.nodes = 0
+
+    def _iterative_deepening(self, connect4_board, parallel=True):
+
+        """Searches one ply deeper at a time until `self.depth`, if any, or the time limit is reached
+
+        An iteration that runs out of time is thrown away, so the returned move
+        always comes from the deepest search that was completed. Every iteration
+        stores its principal variation in the transposition table, where the
+        next, deeper one picks it up as its first move at every node.
+
+        Returns:
+            tuple -- (best column found counted from 1, its util)
+        """
+
+        moves = [move for move in range(1, WIDTH + 1) if connect4_board.is_valid(move)]
+        b_move = moves[0]
+        b_util = None
+
+        stack_size = len(connect4_board.move_stack)
+        current_player = connect4_board.current_player
+        empty_cells = WIDTH * HEIGHT - connect4_board.bitboard.moves
+
+        iteration_times = []
+
+        if self.incremental:
+            connect4_board.track_streaks()
+
+        max_depth = empty_cells if self.depth is None else min(self.depth, empty_cells)
+
+        for depth in range(1, max_depth + 1):
+            self.search_depth = depth
+            start = datetime.datetime.now()
+
+            try:
+                if parallel and self.threads > 1 and depth > 2:
+                    move, util_value = self._parallel_root_search(connect4_board)
+                else:
+                    move, util_value = self._aspiration_search(connect4_board, b_util)
+            except SearchTimeout:
+                # unwind the moves the interrupted search left on the board
+                while len(connect4_board.move_stack) > stack_size:
+                    connect4_board.undo_move()
+                connect4_board.current_player = current_player
+                logger.bind(verbose=True).debug(
+                    "Depth {} ran out of time, it was discarded".format(depth)
+                )
+                break
+
+            b_move = move
+            b_util = util_value
+            iteration_times.append((datetime.datetime.now() - start).total_seconds())
+            if self.stats is not None:
+                self.stats.iterations[depth] = iteration_times[-1]
+            logger.bind(verbose=True).debug(
+                "Depth {} searched in {:.3f}s: column {} with util {}, pv: {}".format(
+                    depth,
+                    iteration_times[-1],
+                    move,
+                    util_value,
+                    self._principal_variation(connect4_board),
+                )
+            )
+
+            # don't start an iteration that is not expected to finish in time
+            if len(iteration_times) >= 2 and iteration_times[-2] > 0:
+                growth = max(iteration_times[-1] / iteration_times[-2], 1)
+            else:
+                growth = WIDTH
+            remaining = (self.move_time_limit - datetime.datetime.now()).total_seconds()
+            if iteration_times[-1] * growth > remaining:
+                break
+
+        connect4_board.streaks = None
+
+        return b_move, b_util
+
+    def _aspiration_search(self, connect4_board, guess):
+
+        """Searches the root within a window around `guess`, the previous iteration's util
+
+        Outside of SearchMode.PVS, or without a guess, the whole (-inf, inf)
+        window is searched. A util that falls outside of the window only bounds
+        the real one, so the search is repeated with that side of the window
+        opened up.
+
+        Returns:
+            tuple -- (best column found counted from 1, its util)
+        """
+
+        if self.search_mode is not SearchMode.PVS or guess is None:
+            return self._minimax(
+                connect4_board=connect4_board, alpha=float("-inf"), beta=float("inf")
+            )
+
+        alpha, beta = guess - ASPIRATION_WINDOW, guess + ASPIRATION_WINDOW
+
+        while True:
+            move, util_value = self._minimax(
+                connect4_board=connect4_board, alpha=alpha, beta=beta
+            )
+            if util_value <= alpha:
+                alpha, failed = float("-inf"), "low"
+            elif util_value >= beta:
+                beta, failed = float("inf"), "high"
+            else:
+                return move, util_value
+            logger.bind(verbose=True).debug(
+                "Depth {} failed {} its aspiration window, re-searching".format(
+                    self.search_depth, failed
+                )
+            )
+
+    def _parallel_root_search(self, connect4_board):
+
+        """Splits the root moves of the current iteration between worker processes
+
+        The best move of the previous iteration is searched alone first, to set a
+        bound. The other moves are then searched concurrently; every worker reads
+        the best bound found so far when it starts on a move and publishes its
+        own result through a value shared between the processes.
+
+        Returns:
+            tuple -- (best column found counted from 1, its util)
+        """
+
+        if self._executor is None:
+            self._shared_alpha = multiprocessing.Value("d", float("-inf"))
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.threads,
+                initializer=_init_search_worker,
+                initargs=(
+                    {
+                        "no": self.no,
+                        "time_limit": self.time_limit,
+                        "difficulty": self.difficulty,
+                        "tt_size": self.tt_size,
+                        "solver_size": self.solver_size,
+                        "stats": self.stats is not None,
+                        "ordering": self.ordering,
+                        "incremental": self.incremental,
+                        "endgame": self.endgame,
+                        "search_mode": self.search_mode,
+                    },
+                    self._shared_alpha,
+                ),
+            )
+        self._shared_alpha.value = float("-inf")
+
+        bitboard = connect4_board.bitboard
+        key, mirrored = bitboard.canonical_key()
+
+        entry = self.transposition_table.peek(key, mirrored)
+        moves = self.ordering.order(bitboard, 0, None if entry is None else entry[3])
+
+        def submit(move):
+
+            return self._executor.submit(
+                _search_root_move,
+                bitboard.position,
+                bitboard.mask,
+                bitboard.moves,
+                move,
+                self.search_depth,
+                self.move_time_limit,
+            )
+
+        results = [submit(moves[0]).result()]
+        results.extend(future.result() for future in [submit(m) for m in moves[1:]])
+
+        b_move, reval = None, float("-inf")
+        timed_out = False
+        worker_nodes = {}
+
+        for move, value, exact, nodes, stats, pid in results:
+            self.nodes += nodes
+            if stats is not None:
+                self.stats.merge(stats)
+            worker_nodes[pid] = worker_nodes.get(pid, 0) + nodes
+            if value is None:
+                timed_out = True
+            elif exact and value > reval:
+                b_move, reval = move, value
+
+        logger.bind(verbose=True).debug(
+            "Depth {} nodes per worker: {}".format(
+                self.search_depth,
+                ", ".join(
+                    "{}: {}".format(pid, nodes) for pid, nodes in worker_nodes.items()
+                ),
+            )
+        )
+
+        if timed_out:
+            raise SearchTimeout
+
+        self.transposition_table.put(
+            key, self.search_depth, Bound.EXACT, reval, b_move, mirrored
+        )
+
+        return b_move, reval
+
+    def _principal_variation(self, connect4_board):
+
+        pv = []
+
+        # entries left by shallower searches are not part of this iteration's pv
+        entry = self.transposition_table.peek(*connect4_board.bitboard.canonical_key())
+        while (
+            entry is not None
+            and entry[3] is not None
+            and entry[0] >= self.search_depth - len(pv)
+        ):
+            pv.append(entry[3])
+            connect4_board.make_move(entry[3])
+            entry = self.transposition_table.peek(
+                *connect4_board.bitboard.canonical_key()
+            )
+
+        for _ in pv:
+            connect4_board.undo_move()
+
+        return pv
 
     def _minimax(self, connect4_board, alpha, beta, depth=0):
 
+        """Alpha-beta search of the board down to `self.search_depth`
+
+        With SearchMode.PVS, only the first move of a node is searched with the
+        whole window; the others are searched with a null window that merely
+        proves them no better, and searched again in full when that fails.
+
+        Returns:
+            tuple -- (best column found counted from 1, its util)
+        """
+
+        self.nodes += 1
+        stats = self.stats
+        if stats is not None:
+            stats.nodes[depth] += 1
+
         if depth > self.max_depth:
             self.max_depth = depth
 
+        # a threshold rather than a multiple, as frontiers add many nodes at once
+        if self.nodes >= self._next_check:
+            self._next_check = self.nodes + TIMEOUT_CHECK_NODES
+            if datetime.datetime.now() > self.move_time_limit:
+                raise SearchTimeout
+
+        if self.endgame is not None:
+            entry = self._probe_endgame(connect4_board.bitboard)
+            if entry is not None:
+                if stats is not None:
+                    stats.leaves[depth] += 1
+                move, score = entry
+                if connect4_board.bitboard.player_no != self.no:
+                    score = -score
+                return move, score * WIN_UTIL
+
         if (
-            depth >= self.depth
-            or datetime.datetime.now() > self.move_time_limit
+            depth >= self.search_depth
             or connect4_board.is_finished()
+            or connect4_board.is_full()
         ):
-            util_value = self._util(connect4_board)
-            self.leaves.append(util_value)
-            return None, util_value
-
-        moves = [
-            move
-            for move in range(1, len(connect4_board.current_grid_state[0]) + 1)
-            if connect4_board.is_valid(move)
-        ]
+            if stats is not None:
+                stats.leaves[depth] += 1
+            return None, self._util(connect4_board)
+
+        remaining_depth = self.search_depth - depth
+        key, mirrored = connect4_board.bitboard.canonical_key()
+        tt_move = None
+
+        entry = self.transposition_table.get(key, mirrored)
+        if entry is not None:
+            if stats is not None:
+                stats.tt_hits[depth] += 1
+            entry_depth, bound, value, tt_move = entry
+            if entry_depth >= remaining_depth:
+                if bound is Bound.EXACT:
+                    return tt_move, value
+                elif bound is Bound.LOWER:
+                    alpha = max(alpha, value)
+                elif bound is Bound.UPPER:
+                    beta = min(beta, value)
+                if beta <= alpha:
+                    return tt_move, value
+
+        window = (alpha, beta)
+
+        if remaining_depth == 1:  # all children are evaluated, order is irrelevant
+            moves = [
+                move for move in range(1, WIDTH + 1) if connect4_board.is_valid(move)
+            ]
+        else:
+            moves = self.ordering.order(connect4_board.bitboard, depth, tt_move)
         branching_factor = 0
 
         try:
@@ -157,17 +748,30 @@ class MiniMaxPlayer(Player):
         except:
             b_move = None
 
-        if connect4_board.current_player is self:
+        if remaining_depth == 1:
+            b_move, reval = self._expand_frontier(connect4_board, moves, depth)
+            branching_factor = len(moves)
+        elif connect4_board.current_player is self:
+            pvs = self.search_mode is SearchMode.PVS
             reval = float("-inf")
 
-            for move in moves:
+            for rank, move in enumerate(moves):
                 branching_factor += 1
 
-                t = connect4_board.copy()
-                t.make_move(move)
-                t.toggle_players()
+                connect4_board.make_move(move)
+                connect4_board.toggle_players()
+
+                if pvs and rank > 0:
+                    _, eval = self._minimax(connect4_board, alpha, alpha + 1, depth + 1)
+                    if alpha < eval < beta:
+                        if stats is not None:
+                            stats.researches[depth] += 1
+                        _, eval = self._minimax(connect4_board, alpha, beta, depth + 1)
+                else:
+                    _, eval = self._minimax(connect4_board, alpha, beta, depth + 1)
 
-                _, eval = self._minimax(t, alpha, beta, depth + 1)
+                connect4_board.toggle_players()
+                connect4_board.undo_move()
 
                 if eval > reval:
                     b_move = move
@@ -175,19 +779,33 @@ class MiniMaxPlayer(Player):
 
                 alpha = max(alpha, reval)
                 if beta <= alpha:
-                    self.cut_offs.append(depth)
+                    self.ordering.cutoff(
+                        connect4_board.bitboard, depth, move, rank, remaining_depth
+                    )
+                    if stats is not None:
+                        stats.cutoffs[depth] += 1
                     break
         else:
+            pvs = self.search_mode is SearchMode.PVS
             reval = float("inf")
 
-            for move in moves:
+            for rank, move in enumerate(moves):
                 branching_factor += 1
 
-                t = connect4_board.copy()
-                t.make_move(move)
-                t.toggle_players()
+                connect4_board.make_move(move)
+                connect4_board.toggle_players()
 
-                _, eval = self._minimax(t, alpha, beta, depth + 1)
+                if pvs and rank > 0:
+                    _, eval = self._minimax(connect4_board, beta - 1, beta, depth + 1)
+                    if alpha < eval < beta:
+                        if stats is not None:
+                            stats.researches[depth] += 1
+                        _, eval = self._minimax(connect4_board, alpha, beta, depth + 1)
+                else:
+                    _, eval = self._minimax(connect4_board, alpha, beta, depth + 1)
+
+                connect4_board.toggle_players()
+                connect4_board.undo_move()
 
                 if eval < reval:
                     b_move = move
@@ -195,39 +813,346 @@ class MiniMaxPlayer(Player):
 
                 beta = min(beta, reval)
                 if beta <= alpha:
-                    self.cut_offs.append(depth)
+                    self.ordering.cutoff(
+                        connect4_board.bitboard, depth, move, rank, remaining_depth
+                    )
+                    if stats is not None:
+                        stats.cutoffs[depth] += 1
                     break
 
-        self.branching_factors.append(branching_factor)
+        if stats is not None:
+            stats.expanded[depth] += 1
+            stats.children[depth] += branching_factor
+
+        if reval <= window[0]:
+            bound = Bound.UPPER
+        elif reval >= window[1]:
+            bound = Bound.LOWER
+        else:
+            bound = Bound.EXACT
+        self.transposition_table.put(
+            key, remaining_depth, bound, reval, b_move, mirrored
+        )
+
         return b_move, reval
 
-    def _util(self, connect4_board):
+    def _expand_frontier(self, connect4_board, moves, depth):
+
+        """Scores all the children of a node right above the search horizon at once
+
+        The children are leaves anyway, so their bitboards are derived from the
+        parent's and evaluated in one go, instead of recursing into each of them.
+
+        Returns:
+            tuple -- (best move, its util)
+        """
+
+        bitboard = connect4_board.bitboard
+        position = bitboard.position
+        opponent = bitboard.position ^ bitboard.mask
+        own_turn = bitboard.player_no == self.no
+        streaks = connect4_board.streaks
+
+        utils = []
+        if streaks is not None:
+            for move in moves:
+                utils.append(streaks.child_utility(bitboard, move - 1, self.no))
+        else:
+            for move in moves:
+                stone = 1 << ((move - 1) * H1 + bitboard.heights[move - 1])
+                if own_turn:
+                    utils.append(utility(position | stone, opponent))
+                else:
+                    utils.append(utility(opponent, position | stone))
+
+        self.nodes += len(moves)
+        if self.stats is not None:
+            self.stats.nodes[depth + 1] += len(moves)
+            self.stats.leaves[depth + 1] += len(moves)
+        if depth + 1 > self.max_depth:
+            self.max_depth = depth + 1
 
         if connect4_board.current_player is self:
-            player_no = connect4_board.current_player.no
-            if player_no == connect4_board.player1.no:
-                enemy_no = connect4_board.player2.no
-            else:
-                enemy_no = connect4_board.player1.no
+            reval = max(utils)
+        else:
+            reval = min(utils)
+
+        return moves[utils.index(reval)], reval
+
+    def _probe_endgame(self, bitboard):
+
+        """Looks a position up in the endgame database, if it may be there
+
+        Returns:
+            tuple -- (best column counted from 1, exact score for the player to
+                     move, see Solver) or None
+        """
+
+        if bitboard.moves < self.endgame.min_moves:
+            return None
+        return self.endgame.probe(*bitboard.canonical_key())
+
+    def _util(self, connect4_board):
 
+        if connect4_board.streaks is not None:
+            return connect4_board.streaks.utility(self.no)
+
+        bitboard = connect4_board.bitboard
+
+        if bitboard.player_no == self.no:
+            return utility(bitboard.position, bitboard.position ^ bitboard.mask)
+        return utility(bitboard.position ^ bitboard.mask, bitboard.position)
+
+    def game_finished(self, connect4_board, won: bool):
+
+        connect4_board.print_board()
+
+        if won:
+            logger.bind(verbose=True).success("AI {} have won.".format(self.no))
         else:
-            enemy_no = connect4_board.current_player.no
-            if enemy_no == connect4_board.player1.no:
-                player_no = connect4_board.player2.no
-            else:
-                player_no = connect4_board.player1.no
-
-        p4streaks = connect4_board.streak(player_no, 4)
-        p3streaks = connect4_board.streak(player_no, 3)
-        p2streaks = connect4_board.streak(player_no, 2)
-        e4streaks = connect4_board.streak(enemy_no, 4)
-
-        return (
-            1024 * 1024 * p4streaks
-            + 1024 * p3streaks
-            + p2streaks
-            - 1024 * 1024 * 1024 * e4streaks
+            logger.bind(verbose=True).success("AI {} have lost.".format(self.no))
+
+        self._stop_pondering()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self.solver is not None:
+            self.solver.reset()
+
+
+# state of a MiniMaxPlayer's worker process, see MiniMaxPlayer._parallel_root_search
+_worker_player = None
+_worker_alpha = None
+
+
+def _init_search_worker(settings, shared_alpha):
+
+    global _worker_player, _worker_alpha
+
+    _worker_player = MiniMaxPlayer(**settings)
+    _worker_alpha = shared_alpha
+
+
+def _search_root_move(position, mask, moves, move, search_depth, move_time_limit):
+
+    """Searches the subtree of one root move in a worker process
+
+    Returns:
+        tuple -- (move, util or None if out of time, whether the util is exact
+                  rather than an upper bound, nodes searched, SearchStats or None,
+                  worker pid)
+    """
+
+    player = _worker_player
+    opponent = Player(no=3 - player.no)
+
+    if player.no == 1:
+        connect4_board = ConnectFourBoard(player, opponent, current_player=player)
+    else:
+        connect4_board = ConnectFourBoard(opponent, player, current_player=player)
+    connect4_board.bitboard = BitBoard(position=position, mask=mask, moves=moves)
+    if player.incremental:
+        connect4_board.track_streaks()
+    connect4_board.make_move(move)
+    connect4_board.toggle_players()
+
+    player._reset_counters()
+    player.search_depth = search_depth
+    player.move_time_limit = move_time_limit
+
+    alpha = _worker_alpha.value
+    try:
+        _, value = player._minimax(connect4_board, alpha, float("inf"), depth=1)
+    except SearchTimeout:
+        return move, None, False, player.nodes, player.stats, os.getpid()
+
+    with _worker_alpha.get_lock():
+        if value > _worker_alpha.value:
+            _worker_alpha.value = value
+
+    return move, value, value > alpha, player.nodes, player.stats, os.getpid()
+
+
+class MCTSPlayer(Player):
+    def __init__(
+        self,
+        difficulty=Difficulty.NORMAL,
+        iterations=None,
+        threads=1,
+        book=None,
+        batch_size=64,
+        *args,
+        **kwargs
+    ):
+
+        super(MCTSPlayer, self).__init__(*args, **kwargs)
+
+        self.difficulty = difficulty
+
+        # the search stops at whichever comes first, the playouts or the time
+        # limit, so without playouts its strength is set by the time limit alone
+        if iterations is None:
+            iterations = MCTS_ITERATIONS[difficulty]
+        self.iterations = iterations
+
+        if isinstance(book, str):
+            book = OpeningBook(book)
+        self.book = book
+
+        # the tree is kept between moves, see MonteCarloTreeSearch.set_position
+        self.batch_size = batch_size
+        self.tree = MonteCarloTreeSearch(batch_size=batch_size)
+
+        # worker processes are only started by the first parallel search
+        self.threads = threads
+        self._executor = None
+
+        self.nodes = 0  # playouts of the last search
+
+    def config(self):
+
+        config = super(MCTSPlayer, self).config()
+        config.update(
+            {
+                "type": Agents.MCTSPlayer.value,
+                "difficulty": self.difficulty.value,
+                "iterations": self.iterations,
+                "threads": self.threads,
+                "book": self.book.path if self.book is not None else None,
+                "batch_size": self.batch_size,
+            }
         )
+        return config
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        return state
+
+    def next_move(self, connect4_board):
+
+        connect4_board.print_board()
+        start = datetime.datetime.now()
+        move, win_rate = self.search(connect4_board=connect4_board)
+        seconds = (datetime.datetime.now() - start).total_seconds()
+        connect4_board.delete_board_from_stdout()
+
+        if win_rate is not None:
+            logger.bind(verbose=True).debug(
+                "{} playouts in {:.3f}s, {:.0f} per second, {:.1%} won".format(
+                    self.nodes,
+                    seconds,
+                    self.nodes / seconds if seconds else 0,
+                    win_rate,
+                )
+            )
+        logger.bind(verbose=True).debug(
+            "AI {}'ve played into column {}.".format(self.no, move)
+        )
+
+        return move
+
+    def search(self, connect4_board):
+
+        """Picks a move for the current player of the board without printing anything
+
+        Returns:
+            tuple -- (column counted from 1, share of its playouts won or None
+                      for a book move)
+        """
+
+        self.nodes = 0
+
+        bitboard = connect4_board.bitboard
+
+        if self.book is not None:
+            entry = self.book.lookup(*bitboard.canonical_key())
+            if entry is not None and connect4_board.is_valid(entry[0]):
+                logger.bind(verbose=True).debug(
+                    "Opening book move: column {} with util {}".format(*entry)
+                )
+                return entry[0], None
+
+        deadline = datetime.datetime.now() + datetime.timedelta(
+            seconds=self.time_limit - 1
+        )
+
+        if self.threads > 1:
+            stats = self._parallel_search(bitboard, deadline)
+        else:
+            reused = self.tree.set_position(bitboard.position, bitboard.mask)
+            if reused:
+                logger.bind(verbose=True).debug(
+                    "Reused {} playouts of the last search".format(
+                        self.tree.root.visits
+                    )
+                )
+            self.tree.search(iterations=self.iterations, deadline=deadline)
+            self.nodes = self.tree.playouts
+            stats = self.tree.root_stats()
+
+        move = max(stats, key=lambda move: stats[move][0])
+        visits, wins = stats[move]
+        return move, wins / visits
+
+    def _parallel_search(self, bitboard, deadline):
+
+        """Grows a tree of its own in every worker process and adds up their root visits
+
+        Every worker keeps its tree between moves, like `self.tree`, and gets an
+        equal share of the playouts.
+
+        Returns:
+            dict -- {column counted from 1: (visits, wins)}
+        """
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.threads,
+                initializer=_init_mcts_worker,
+                initargs=(self.batch_size,),
+            )
+
+        iterations = self.iterations
+        if iterations is not None:
+            iterations = -(-iterations // self.threads)
+
+        futures = [
+            self._executor.submit(
+                _search_mcts_tree,
+                bitboard.position,
+                bitboard.mask,
+                iterations,
+                deadline,
+            )
+            for _ in range(self.threads)
+        ]
+
+        # a worker handed more than one search grew the same tree each time
+        trees = {}
+        for future in futures:
+            stats, playouts, pid = future.result()
+            self.nodes += playouts
+            visits = sum(visits for visits, _ in stats.values())
+            if pid not in trees or visits > trees[pid][0]:
+                trees[pid] = (visits, stats)
+
+        merged = {}
+        for _, stats in trees.values():
+            for move, (visits, wins) in stats.items():
+                total_visits, total_wins = merged.get(move, (0, 0.0))
+                merged[move] = (total_visits + visits, total_wins + wins)
+
+        logger.bind(verbose=True).debug(
+            "Playouts per worker: {}".format(
+                ", ".join(
+                    "{}: {}".format(pid, visits) for pid, (visits, _) in trees.items()
+                )
+            )
+        )
+
+        return merged
 
     def game_finished(self, connect4_board, won: bool):
 
@@ -238,8 +1163,43 @@ class MiniMaxPlayer(Player):
         else:
             logger.bind(verbose=True).success("AI {} have lost.".format(self.no))
 
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+# tree of an MCTSPlayer's worker process, see MCTSPlayer._parallel_search
+_worker_tree = None
+
+
+def _init_mcts_worker(batch_size):
+
+    global _worker_tree
+
+    _worker_tree = MonteCarloTreeSearch(batch_size=batch_size)
+
+
+def _search_mcts_tree(position, mask, iterations, deadline):
+
+    """Searches the position with the worker's tree, reusing it from the last move
+
+    Returns:
+        tuple -- ({column counted from 1: (visits, wins)}, playouts, worker pid)
+    """
+
+    _worker_tree.set_position(position, mask)
+    _worker_tree.search(iterations=iterations, deadline=deadline)
+
+    return _worker_tree.root_stats(), _worker_tree.playouts, os.getpid()
+
 
 class HumanPlayer(Player):
+    def config(self):
+
+        config = super(HumanPlayer, self).config()
+        config["type"] = Agents.HumanPlayer.value
+        return config
+
     def next_move(self, connect4_board):
 
         connect4_board.print_board()
@@ -325,24 +1285,7 @@ class HumanPlayer(Player):
 
                 return False
 
-            save_file = TinyDB(inp[1], storage=CachingMiddleware(JSONStorage))
-            save_file.purge()
-
-            with open("{}.player".format(hash(connect4_board.player1)), "wb") as p1:
-                pickle.dump(connect4_board.player1, p1)
-            with open("{}.player".format(hash(connect4_board.player2)), "wb") as p2:
-                pickle.dump(connect4_board.player2, p2)
-
-            save_file.insert(
-                {
-                    "fname": inp[1],
-                    "board": connect4_board.current_grid_state.tolist(),
-                    "current_player": connect4_board.current_player.no,
-                    "player1": "{}.player".format(hash(connect4_board.player1)),
-                    "player2": "{}.player".format(hash(connect4_board.player2)),
-                }
-            )
-            save_file.close()
+            save_game(inp[1], connect4_board)
 
             return True
 
@@ -403,14 +1346,46 @@ class NetworkPlayer(Player):
         FinishedWin = "FW"
         FinishedLose = "FL"
 
+    # seconds before a message is retransmitted, doubled after every retry
+    RETRANSMIT_DELAY = 0.5
+    MAX_RETRANSMIT_DELAY = 8
+    MAX_RETRANSMITS = 6
+
     class Server(DatagramServer):
+        """
+        Receives the peer's messages and sends ours from the same socket
+
+        Our messages carry a sequence number in the "seq" key of their elements
+        and the peer acknowledges them with a Null element holding the number
+        in its "ack" key, which we do for the peer's messages in turn. Peers
+        that don't know about these keys ignore them, so they keep working,
+        only without acks.
+        Moves carry the key of the position after them in their "checksum" key.
+        Once both peers offer it in their "sync" key, boards are left out of
+        the messages and only sent on a ResendBoard request, when the position
+        after a move doesn't match its checksum.
+        Received moves are put on a queue that `NetworkPlayer.next_move` blocks
+        on, and repeated messages, e.g. retransmissions whose ack got lost, are
+        dropped.
+        """
+
         def __init__(self, owner, *args, **kwargs):
 
             super(NetworkPlayer.Server, self).__init__(*args, **kwargs)
 
             self.owner = owner
             self.latest_recieved_board = None
-            self.latest_recieved_move = None
+            self.moves = Queue()  # (move, checksum or None)
+            self.boards = Queue()  # boards sent on their own, on a ResendBoard
+
+            self.sent_seq = 0
+            self.recieved_seq = 0
+            self.acks = {}  # seq: Event set once the peer acknowledged it
+            self.peer_acks = False
+            # whether the peer reads game.wire's binary format
+            self.peer_binary = False
+            # whether the peer does without boards
+            self.peer_delta = False
 
         def handle(self, data, address):
 
@@ -418,21 +1393,37 @@ class NetworkPlayer(Player):
 
             if address[0] == self.owner.peer_address:
 
-                data = json.loads(data.decode())
+                data, binary = wire.decode(data)
+                if self.owner.wire == "binary" and (
+                    binary or any(elm.get("wire") == wire.OFFER for elm in data)
+                ):
+                    self.peer_binary = True
+                if self.owner.sync == "delta" and any(
+                    elm.get("sync") == wire.SYNC_OFFER for elm in data
+                ):
+                    self.peer_delta = True
+
+                if self._is_repeated(data):
+                    logger.debug("Dropped a repeated message.")
+                    return
 
                 for elm in data:
 
                     latest_recieved_data = NetworkPlayer.Data(elm["type"])
 
                     if latest_recieved_data is NetworkPlayer.Data.Move:
-                        self.latest_recieved_move = elm["content"]
+                        # the first message of a peer moving second has none
+                        if elm["content"] is not None:
+                            self.moves.put((elm["content"], elm.get("checksum")))
                         logger.debug(
                             "Recieved {}:{}.".format(
-                                latest_recieved_data, self.latest_recieved_move
+                                latest_recieved_data, elm["content"]
                             )
                         )
                     elif latest_recieved_data is NetworkPlayer.Data.Board:
                         self.latest_recieved_board = np.array(elm["content"], dtype=int)
+                        if len(data) == 1:
+                            self.boards.put(self.latest_recieved_board)
                         logger.debug(
                             "Recieved {}:\n{}.".format(
                                 latest_recieved_data,
@@ -440,46 +1431,114 @@ class NetworkPlayer(Player):
                             )
                         )
                     elif latest_recieved_data is NetworkPlayer.Data.ResendBoard:
-                        NetworkPlayer.Server.send(
+                        self.send(
                             data=[
                                 {
                                     "type": NetworkPlayer.Data.Board.value,
                                     "content": self.owner.latest_connect4_board,
                                 }
-                            ],
-                            address=self.owner.peer_address,
-                            port=self.owner.peer_port,
+                            ]
                         )
                     elif latest_recieved_data is NetworkPlayer.Data.Resend:
-                        NetworkPlayer.Server.send(
-                            data=self.owner.latest_sent_message,
-                            address=self.owner.peer_address,
-                            port=self.owner.peer_port,
-                        )
+                        self.send(data=self.owner.latest_sent_message)
                     elif latest_recieved_data is NetworkPlayer.Data.Log:
                         logger.bind(verbose=True).info("```" + elm["content"] + "```")
+                    elif latest_recieved_data is NetworkPlayer.Data.Null:
+                        if "ack" in elm:
+                            self.peer_acks = True
+                            acked = self.acks.pop(elm["ack"], None)
+                            if acked is not None:
+                                acked.set()
                     elif latest_recieved_data in (
-                        NetworkPlayer.Data.Null,
                         NetworkPlayer.Data.FinishedWin,
                         NetworkPlayer.Data.FinishedLose,
                     ):
                         pass
 
-        @staticmethod
-        def send(data, address, port):
+        def _is_repeated(self, data):
+
+            """Acknowledges a numbered message and checks whether it was seen before
+
+            Messages of peers that don't number them are told apart by their board,
+            which changes with every move.
+
+            Returns:
+                bool -- True if the message was already handled
+            """
+
+            seqs = [elm["seq"] for elm in data if "seq" in elm]
+
+            if seqs:
+                # a peer numbering its messages acks ours too, even before its
+                # first ack gets through
+                self.peer_acks = True
+                self.send(
+                    data=[
+                        {
+                            "type": NetworkPlayer.Data.Null.value,
+                            "content": None,
+                            "ack": seqs[0],
+                        }
+                    ]
+                )
+                if seqs[0] <= self.recieved_seq:
+                    return True
+                self.recieved_seq = seqs[0]
+                return False
+
+            # a lone board answers a ResendBoard request and is always wanted
+            for elm in data if len(data) > 1 else ():
+                if (
+                    elm["type"] == NetworkPlayer.Data.Board.value
+                    and self.latest_recieved_board is not None
+                    and np.array_equal(self.latest_recieved_board, elm["content"])
+                ):
+                    return True
+
+            return False
 
-            data = json.dumps(data).encode()
+        def send(self, data):
 
-            sock = gevent.socket.socket(type=gevent.socket.SOCK_DGRAM)
-            sock.connect((address, port))
-            sock.send(data)
-            sock.close()
+            if self.owner.session is not None:
+                for elm in data:
+                    elm["session"] = self.owner.session
+
+            if self.owner.sync == "delta":
+                data[0]["sync"] = wire.SYNC_OFFER
 
-    def __init__(self, peer_address, peer_port=3500, local_port=3500, *args, **kwargs):
+            if self.peer_binary:
+                data = wire.encode(data)
+            else:
+                if self.owner.wire == "binary":
+                    data[0]["wire"] = wire.OFFER
+                data = json.dumps(data).encode()
+
+            self.sendto(data, (self.owner.peer_address, self.owner.peer_port))
+
+    def __init__(
+        self,
+        peer_address,
+        peer_port=3500,
+        local_port=3500,
+        session=None,
+        wire="binary",
+        sync="delta",
+        *args,
+        **kwargs
+    ):
 
         super(NetworkPlayer, self).__init__(*args, **kwargs)
 
+        # "binary" offers game.wire's format to the peer and switches to it once
+        # the peer offers it too, "json" sticks to JSON
+        self.wire = wire
+        # "delta" offers to send moves with checksums only and does so once the
+        # peer offers it too, "board" sends the whole board with every move
+        self.sync = sync
+
         self.latest_connect4_board = None
+        # names our match on a game server hosting many, see game.server
+        self.session = session
 
         self.peer_address = peer_address
         self.peer_port = peer_port
@@ -491,75 +1550,175 @@ class NetworkPlayer(Player):
             {"type": NetworkPlayer.Data.Null.value, "content": None}
         ]
 
-    def next_move(self, connect4_board):
+    def _send(self, message, retransmits=None):
+
+        """Numbers a message, sends it and keeps retransmitting it until it is acked
+
+        Arguments:
+            retransmits -- most retransmissions, None to retransmit until the
+                           message is acked or the greenlet is killed
+
+        Returns:
+            Greenlet -- the retransmitting greenlet, done once the message is acked
+        """
+
+        self.server.sent_seq += 1
+        seq = self.server.sent_seq
+        for elm in message:
+            elm["seq"] = seq
+
+        acked = Event()
+        self.server.acks[seq] = acked
+        self.latest_sent_message = message
+        self.server.send(data=message)
+
+        return gevent.spawn(self._retransmit, message, acked, retransmits)
 
+    def _retransmit(self, message, acked, retransmits):
+
+        delay = NetworkPlayer.RETRANSMIT_DELAY
+        retransmitted = 0
+
+        while retransmits is None or retransmitted < retransmits:
+            if acked.wait(timeout=delay):
+                return
+            retransmitted += 1
+            # peers that never ack would take a copy of a move for their next one
+            if self.server.peer_acks:
+                logger.debug("Retransmitting {}.".format(message))
+                self.server.send(data=message)
+            delay = min(2 * delay, NetworkPlayer.MAX_RETRANSMIT_DELAY)
+
+    def _message(self, connect4_board):
+
+        """The latest move with the checksum of the position after it, and the
+        board unless the peer does without"""
+
+        # kept to answer ResendBoard requests
         self.latest_connect4_board = connect4_board.current_grid_state.tolist()
 
-        self.latest_sent_message = [
+        message = [
             {
                 "type": NetworkPlayer.Data.Move.value,
                 "content": connect4_board.latest_move,
-            },
-            {
-                "type": NetworkPlayer.Data.Board.value,
-                "content": self.latest_connect4_board,
-            },
+                "checksum": connect4_board.bitboard.key(),
+            }
         ]
+        if not self.server.peer_delta:
+            message.append(
+                {
+                    "type": NetworkPlayer.Data.Board.value,
+                    "content": self.latest_connect4_board,
+                }
+            )
 
-        NetworkPlayer.Server.send(
-            data=self.latest_sent_message,
-            address=self.peer_address,
-            port=self.peer_port,
-        )
+        return message
+
+    def next_move(self, connect4_board):
+
+        # our move is retransmitted for as long as we wait for the peer's
+        retransmitting = self._send(self._message(connect4_board))
 
         connect4_board.print_board()
         print(
             self.color + "Waiting for player{}'s response".format(self.no) + Fore.RESET
         )
 
+        delay = NetworkPlayer.RETRANSMIT_DELAY
+
         while True:
-            while self.server.latest_recieved_move is None:
-                gevent.sleep(0)
+            try:
+                nxt_mv, checksum = self.server.moves.get(timeout=delay)
+            except Empty:
+                # the peer's move may have got lost and it can't know, ask for it
+                if not self.server.peer_acks:
+                    self.server.send(
+                        data=[
+                            {"type": NetworkPlayer.Data.Resend.value, "content": None}
+                        ]
+                    )
+                delay = min(2 * delay, NetworkPlayer.MAX_RETRANSMIT_DELAY)
+                continue
 
-            nxt_mv = self.server.latest_recieved_move
-            self.server.latest_recieved_move = None
             if connect4_board.is_valid(nxt_mv):
                 break
 
+        # the peer answered our move, so it got it
+        retransmitting.kill()
+
+        if not self._in_sync(connect4_board, nxt_mv, checksum):
+            self._resync(connect4_board, nxt_mv)
+
         print("\x1b[1A", end="")
         print("\x1b[2K", end="")
         connect4_board.delete_board_from_stdout()
 
         return nxt_mv
 
-    def game_finished(self, connect4_board, won: bool):
+    @staticmethod
+    def _in_sync(connect4_board, move, checksum):
 
-        self.latest_connect4_board = connect4_board.current_grid_state.tolist()
+        """Checks the position after the peer's move against the peer's checksum,
+        peers that don't send one are trusted"""
 
-        self.latest_sent_message = [
-            {"type": NetworkPlayer.Data.Null.value, "content": None},
-            {
-                "type": NetworkPlayer.Data.Move.value,
-                "content": connect4_board.latest_move,
-            },
-            {
-                "type": NetworkPlayer.Data.Board.value,
-                "content": self.latest_connect4_board,
-            },
-        ]
+        if checksum is None:
+            return True
+
+        bitboard = connect4_board.bitboard.copy()
+        bitboard.play(move - 1)
+
+        return bitboard.key() == checksum
+
+    def _resync(self, connect4_board, move):
+
+        """Asks the peer for its board and takes it over, up to its last move,
+        which the game loop makes"""
+
+        logger.bind(verbose=True).warning(
+            "The board diverged from player{}'s, asking for theirs.".format(self.no)
+        )
+
+        # boards of earlier requests answered more than once
+        while not self.server.boards.empty():
+            self.server.boards.get()
+
+        delay = NetworkPlayer.RETRANSMIT_DELAY
+
+        while True:
+            self.server.send(
+                data=[{"type": NetworkPlayer.Data.ResendBoard.value, "content": None}]
+            )
+            try:
+                grid = np.array(self.server.boards.get(timeout=delay), dtype=int)
+                break
+            except Empty:
+                delay = min(2 * delay, NetworkPlayer.MAX_RETRANSMIT_DELAY)
+
+        # the top disc of the move's column is the peer's move
+        col = move - 1
+        row = np.flatnonzero(grid[:, col])[0]
+        grid[row, col] = 0
+
+        connect4_board.current_grid_state = grid
+
+    def game_finished(self, connect4_board, won: bool):
+
+        message = [
+            {"type": NetworkPlayer.Data.Null.value, "content": None}
+        ] + self._message(connect4_board)
 
         if won:
             logger.bind(verbose=True).success("Player {} have won.".format(self.no))
-            self.latest_sent_message[0]["type"] = NetworkPlayer.Data.FinishedLose.value
+            message[0]["type"] = NetworkPlayer.Data.FinishedLose.value
         else:
             logger.bind(verbose=True).success("Player {} have lost.".format(self.no))
-            self.latest_sent_message[0]["type"] = NetworkPlayer.Data.FinishedWin.value
+            message[0]["type"] = NetworkPlayer.Data.FinishedWin.value
 
-        self.server.send(
-            data=self.latest_sent_message,
-            address=self.peer_address,
-            port=self.peer_port,
-        )
+        # give the last message a chance to arrive before the game exits, peers
+        # that never ack would only keep us waiting
+        retransmitting = self._send(message, NetworkPlayer.MAX_RETRANSMITS)
+        if self.server.peer_acks:
+            retransmitting.join()
 
 
 def RandomPlayer(*args, **kwargs):
@@ -571,4 +1730,24 @@ agents = {
     Agents.HumanPlayer: HumanPlayer,
     Agents.NetworkPlayer: NetworkPlayer,
     Agents.MiniMaxPlayer: MiniMaxPlayer,
+    Agents.MCTSPlayer: MCTSPlayer,
 }
+
+
+def player_from_config(config):
+
+    """Builds a player from the settings `Player.config` returned"""
+
+    config = dict(config)
+    agent = Agents(config.pop("type"))
+
+    if agent is Agents.MiniMaxPlayer:
+        config["difficulty"] = Difficulty(config["difficulty"])
+        config["ordering"] = parse_ordering(config["ordering"])
+        config["search_mode"] = SearchMode(
+            config.get("search_mode", SearchMode.ALPHABETA.value)
+        )
+    elif agent is Agents.MCTSPlayer:
+        config["difficulty"] = Difficulty(config["difficulty"])
+
+    return agents[agent](**config)
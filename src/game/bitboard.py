@@ -0,0 +1,295 @@
+import numpy as np
+
+WIDTH = 7
+HEIGHT = 6
+H1 = HEIGHT + 1  # every column keeps an extra sentinel bit on top
+
+BOTTOM_MASK = sum(1 << (col * H1) for col in range(WIDTH))
+BOARD_MASK = BOTTOM_MASK * ((1 << HEIGHT) - 1)
+
+# vertical, horizontal, and both diagonals as bit shifts in the 7x(6+1) layout
+DIRECTIONS = (1, H1, H1 - 1, H1 + 1)
+
+
+def top_mask(col):
+
+    return 1 << (HEIGHT - 1 + col * H1)
+
+
+def bottom_mask(col):
+
+    return 1 << (col * H1)
+
+
+def column_mask(col):
+
+    return ((1 << HEIGHT) - 1) << (col * H1)
+
+
+# bits of a column, sentinel included, and how far it is from its mirror image
+MIRROR_PAIRS = [
+    (((1 << H1) - 1) << (col * H1), (WIDTH - 1 - 2 * col) * H1)
+    for col in range(WIDTH // 2)
+]
+CENTER_COLUMN = ((1 << H1) - 1) << (WIDTH // 2 * H1) if WIDTH % 2 else 0
+
+
+def mirror(bits):
+    """Mirrors bits left to right, e.g. stones or a position key
+
+    Keys never carry across columns, so the mirrored key of a position is
+    the key of the mirrored position.
+    """
+
+    mirrored = bits & CENTER_COLUMN
+    for column, distance in MIRROR_PAIRS:
+        mirrored |= (bits & column) << distance | (bits >> distance) & column
+    return mirrored
+
+
+def mirror_move(move):
+    """The column, counted from 1, mirroring `move`"""
+
+    return WIDTH + 1 - move
+
+
+if hasattr(int, "bit_count"):  # Python 3.10+
+    popcount = int.bit_count
+else:
+
+    def popcount(bits):
+
+        return bin(bits).count("1")
+
+
+def alignment(bits):
+    """Checks whether the given stones contain four in a row in any direction
+
+    Returns:
+        bool -- True if there is at least one line of four
+    """
+
+    for direction in DIRECTIONS:
+        m = bits & (bits >> direction)
+        if m & (m >> (2 * direction)):
+            return True
+
+    return False
+
+
+def connects_four(bits, col, row):
+    """Checks only the four lines through the cell at (`col`, `row`)
+
+    Returns:
+        bool -- True if that cell is part of a line of four of the given stones
+    """
+
+    bit = 1 << (col * H1 + row)
+
+    for direction in DIRECTIONS:
+        count = 1
+        b = bit << direction
+        while b & bits:
+            count += 1
+            b <<= direction
+        b = bit >> direction
+        while b & bits:
+            count += 1
+            b >>= direction
+        if count >= 4:
+            return True
+
+    return False
+
+
+def winning_cells(position, mask):
+    """Finds the empty cells that would complete a line of four of `position`
+
+    Returns:
+        int -- bitboard of those cells, whether they are playable yet or not
+    """
+
+    # vertical
+    cells = (position << 1) & (position << 2) & (position << 3)
+
+    for direction in DIRECTIONS[1:]:
+        m = (position << direction) & (position << (2 * direction))
+        cells |= m & (position << (3 * direction))
+        cells |= m & (position >> direction)
+        m = (position >> direction) & (position >> (2 * direction))
+        cells |= m & (position << direction)
+        cells |= m & (position >> (3 * direction))
+
+    return cells & (BOARD_MASK ^ mask)
+
+
+def count_streaks(bits, streak):
+    """Counts every window of `streak` consecutive stones, in all directions
+
+    Overlapping windows are counted separately, so a horizontal line of four
+    holds three streaks of two, two streaks of three and one streak of four.
+    """
+
+    score = 0
+
+    for direction in DIRECTIONS:
+        m = bits
+        for i in range(1, streak):
+            m &= bits >> (i * direction)
+        score += popcount(m)
+
+    return score
+
+
+class BitBoard(object):
+    """
+    Bitboard representation of a connect four position
+
+    Bit `col * 7 + row` stands for the cell at column `col` and row `row`,
+    counted from the bottom left corner; the 7th bit of every column is
+    always empty so that shifting never wraps across columns.
+    `mask` holds every disc on the board and `position` holds the discs
+    of the player whose turn it is. Player 1 always moves first, so the
+    number of discs played tells which player that is.
+    `mirrored_position` and `mirrored_mask` are the same for the mirror
+    image of the position, played along so `canonical_key` costs no more
+    than `key`. They are only computed when not given.
+    """
+
+    def __init__(
+        self,
+        position=0,
+        mask=0,
+        moves=0,
+        heights=None,
+        mirrored_position=None,
+        mirrored_mask=None,
+    ):
+
+        self.position = position
+        self.mask = mask
+        self.moves = moves
+
+        if mirrored_position is None:
+            mirrored_position = mirror(position)
+        if mirrored_mask is None:
+            mirrored_mask = mirror(mask)
+        self.mirrored_position = mirrored_position
+        self.mirrored_mask = mirrored_mask
+
+        if heights is None:
+            heights = [popcount(mask & column_mask(col)) for col in range(WIDTH)]
+        self.heights = heights  # number of discs in every column
+
+    @classmethod
+    def from_grid(cls, grid):
+
+        position = 0
+        mask = 0
+        moves = 0
+        to_move = 1 if np.count_nonzero(grid) % 2 == 0 else 2
+
+        for col in range(WIDTH):
+            for row in range(HEIGHT):
+                cell = grid[HEIGHT - 1 - row][col]
+                if cell != 0:
+                    bit = 1 << (col * H1 + row)
+                    mask |= bit
+                    moves += 1
+                    if cell == to_move:
+                        position |= bit
+
+        return cls(position=position, mask=mask, moves=moves)
+
+    def to_grid(self):
+
+        grid = np.zeros((HEIGHT, WIDTH), dtype=int)
+        to_move = self.player_no
+        other = 3 - to_move
+
+        for col in range(WIDTH):
+            for row in range(HEIGHT):
+                bit = 1 << (col * H1 + row)
+                if self.mask & bit:
+                    grid[HEIGHT - 1 - row][col] = (
+                        to_move if self.position & bit else other
+                    )
+
+        return grid
+
+    @property
+    def player_no(self):
+
+        return 1 if self.moves % 2 == 0 else 2
+
+    def stones(self, player_no):
+
+        if player_no == self.player_no:
+            return self.position
+        return self.position ^ self.mask
+
+    def height(self, col):
+
+        return self.heights[col]
+
+    def can_play(self, col):
+
+        return self.heights[col] < HEIGHT
+
+    def play(self, col):
+
+        height = self.heights[col]
+        self.position ^= self.mask
+        self.mask |= 1 << (col * H1 + height)
+        self.mirrored_position ^= self.mirrored_mask
+        self.mirrored_mask |= 1 << ((WIDTH - 1 - col) * H1 + height)
+        self.heights[col] = height + 1
+        self.moves += 1
+
+    def undo(self, col):
+
+        height = self.heights[col] - 1
+        self.heights[col] = height
+        self.mask ^= 1 << (col * H1 + height)
+        self.position ^= self.mask
+        self.mirrored_mask ^= 1 << ((WIDTH - 1 - col) * H1 + height)
+        self.mirrored_position ^= self.mirrored_mask
+        self.moves -= 1
+
+    def is_winning_move(self, col):
+
+        position = self.position | ((self.mask + bottom_mask(col)) & column_mask(col))
+        return alignment(position)
+
+    def is_full(self):
+
+        return self.mask == BOARD_MASK
+
+    def key(self):
+
+        return self.position + self.mask
+
+    def canonical_key(self):
+        """Keys the position and its mirror image alike, for tables that store either
+
+        Returns:
+            tuple -- (the smaller of both keys, whether it is the mirror image's,
+                      in which case moves stored with it are mirrored too)
+        """
+
+        key = self.position + self.mask
+        mirrored = self.mirrored_position + self.mirrored_mask
+        if mirrored < key:
+            return mirrored, True
+        return key, False
+
+    def copy(self):
+
+        board = BitBoard.__new__(BitBoard)
+        board.position = self.position
+        board.mask = self.mask
+        board.moves = self.moves
+        board.mirrored_position = self.mirrored_position
+        board.mirrored_mask = self.mirrored_mask
+        board.heights = list(self.heights)
+        return board
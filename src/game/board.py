@@ -1,5 +1,7 @@
 from colorama import Fore
-import numpy as np
+
+from game.bitboard import HEIGHT, WIDTH, BitBoard, connects_four, count_streaks
+from game.evaluation import StreakCounts
 
 
 # for the print board function
@@ -15,9 +17,9 @@ def check_color(x):
 
 class ConnectFourBoard(object):
     """
-        Suppose the game is a numpy array of 6*7, initially all cells are filled with zeros
-        when it's player 1's turn, a "1" is put into the cell
-        when it's player 2's turn, a "2" is put into the cell
+        The game is kept as a pair of bitboards (see game.bitboard.BitBoard)
+        `current_grid_state` is a numpy array view of 6*7 of it, where empty cells are zeros
+        player 1's discs are "1"s and player 2's discs are "2"s
     """
 
     def __init__(self, player1, player2, current_player=None, initial_state=None):
@@ -29,13 +31,18 @@ class ConnectFourBoard(object):
         self.current_player = current_player
 
         if initial_state is None:
-            initial_state = np.zeros(
-                (6, 7), dtype=int
-            )  # grid size of the connect four game is 6*7
-        self.current_grid_state = initial_state  # All zeros
+            self.bitboard = BitBoard()  # All empty
+        else:
+            self.bitboard = BitBoard.from_grid(initial_state)
 
+        # (row, column, player no) of every disc placed through this board,
+        # rows and columns are zero-indexed as in `current_grid_state`
+        self.move_stack = []
         self.latest_move = None
 
+        # StreakCounts kept up to date by make_move and undo_move, if tracked
+        self.streaks = None
+
     def start_game_loop(self):
         tie = False
         while not self.is_finished():
@@ -70,98 +77,63 @@ class ConnectFourBoard(object):
 
         return self.current_player.next_move(self)
 
-    def make_move(self, move):
-
-        for row in range(5, -1, -1):
-            if self.current_grid_state[row][move - 1] == 0:
-                self.current_grid_state[row][move - 1] = self.current_player.no
-                break
-
-    @staticmethod
-    def _row_streak(row, player_no, streak):
-
-        score = 0
-
-        if len(row) >= streak:
-            for i in range(len(row) - streak + 1):
-                true_streak = True
-                for no in range(streak):
-                    if row[i + no] != player_no:
-                        true_streak = False
-                        break
-                if true_streak:
-                    score += 1
-
-        return score
+    @property
+    def current_grid_state(self):
 
-    @staticmethod
-    def _diag_streak(board, player_no, streak):
+        return self.bitboard.to_grid()
 
-        """Gets the -ve sloop diagonals of the input board and checks it for streaks
+    @current_grid_state.setter
+    def current_grid_state(self, grid):
 
-        Returns:
-            int -- number of streaks in the diagonals of the given board
-        """
+        self.bitboard = BitBoard.from_grid(grid)
+        self.move_stack = []
+        if self.streaks is not None:
+            self.track_streaks()
 
-        score = 0
-
-        for i in range(0, -len(board), -1):
-            score += ConnectFourBoard._row_streak(
-                np.diagonal(board, i), player_no, streak
-            )
-        for i in range(1, len(board[0])):
-            score += ConnectFourBoard._row_streak(
-                np.diagonal(board, i), player_no, streak
-            )
-
-        return score
-
-    @staticmethod
-    def _total_diag_streak(board, player_no, streak):
-
-        return ConnectFourBoard._diag_streak(
-            board, player_no, streak
-        ) + ConnectFourBoard._diag_streak(np.flip(board, 1), player_no, streak)
+    def make_move(self, move):
 
-    @staticmethod
-    def _horz_streak(board, player_no, streak):
+        col = move - 1
+        if self.bitboard.can_play(col):
+            row = HEIGHT - 1 - self.bitboard.height(col)
+            self.move_stack.append((row, col, self.bitboard.player_no))
+            if self.streaks is not None:
+                self.streaks.play(self.bitboard, col)
+            self.bitboard.play(col)
 
-        score = 0
+    def undo_move(self):
 
-        for i in range(len(board)):
-            score += ConnectFourBoard._row_streak(board[i], player_no, streak)
+        _, col, _ = self.move_stack.pop()
+        self.bitboard.undo(col)
+        if self.streaks is not None:
+            self.streaks.undo()
 
-        return score
+        return col + 1
 
-    @staticmethod
-    def _vert_streak(board, player_no, streak):
+    def track_streaks(self):
+        """Starts keeping StreakCounts of the current bitboard, see `streaks`"""
 
-        return ConnectFourBoard._horz_streak(np.transpose(board), player_no, streak)
+        self.streaks = StreakCounts(self.bitboard)
 
     def streak(self, player_no, streak):
 
-        board = self.current_grid_state
-
-        return (
-            ConnectFourBoard._total_diag_streak(board, player_no, streak)
-            + ConnectFourBoard._horz_streak(board, player_no, streak)
-            + ConnectFourBoard._vert_streak(board, player_no, streak)
-        )
+        return count_streaks(self.bitboard.stones(player_no), streak)
 
     def is_valid(self, move):
-        if self.current_grid_state[0][move - 1] == 0:
+        if 1 <= move <= WIDTH and self.bitboard.can_play(move - 1):
             return True
         return False
 
     def is_full(self):
 
-        cnt_nonzero = len(np.nonzero(self.current_grid_state)[0])
-
-        if cnt_nonzero == 6 * 7:
-            return True
+        return self.bitboard.is_full()
 
     def is_finished(self):
 
+        if self.move_stack:
+            row, col, player_no = self.move_stack[-1]
+            return connects_four(self.bitboard.stones(player_no), col, HEIGHT - 1 - row)
+
+        # no disc was placed through this board yet (e.g. a loaded position)
         if self.current_player == self.player1:
             if self.streak(self.player2.no, 4):
                 return True
@@ -172,12 +144,15 @@ class ConnectFourBoard(object):
         return False
 
     def copy(self):
-        return ConnectFourBoard(
-            player1=self.player1,
-            player2=self.player2,
-            current_player=self.current_player,
-            initial_state=self.current_grid_state.copy(),
-        )
+        board = ConnectFourBoard.__new__(ConnectFourBoard)
+        board.player1 = self.player1
+        board.player2 = self.player2
+        board.current_player = self.current_player
+        board.bitboard = self.bitboard.copy()
+        board.move_stack = list(self.move_stack)
+        board.latest_move = None
+        board.streaks = None
+        return board
 
     """
     Board should look like this: (with red and yellow 'O's)
@@ -204,6 +179,8 @@ class ConnectFourBoard(object):
         print(Fore.BLUE + "  1   2   3   4   5   6   7")  # Number of columns
         print(frame)
 
+        grid = self.current_grid_state
+
         for x in range(0, 6):
             for y in range(0, 7):
 
@@ -211,8 +188,8 @@ class ConnectFourBoard(object):
                     print(next_col_symbol, end=" ")
                     next_col_symbol = "+"
 
-                if self.current_grid_state[x, y] != 0:  # 1 or 2
-                    current_color = check_color(self.current_grid_state[x, y])
+                if grid[x, y] != 0:  # 1 or 2
+                    current_color = check_color(grid[x, y])
                     print(current_color + "O" + Fore.BLUE, end=" ")
                 else:
                     print(" ", end=" ")
@@ -0,0 +1,136 @@
+import mmap
+import struct
+
+from loguru import logger
+
+from game.bitboard import WIDTH, mirror_move
+from game.board import ConnectFourBoard
+
+MAGIC = b"C4OB"
+VERSION = 2
+
+# magic, version, number of records
+HEADER = struct.Struct("<4sHI")
+# canonical position key, best column of the canonical position counted from 1,
+# util of the position for its player
+RECORD = struct.Struct("<QBq")
+KEY = struct.Struct("<Q")
+
+
+class OpeningBook(object):
+    """
+    Read-only view of a book file written by `generate_book`
+
+    The file is a header followed by records sorted by position key. It is
+    memory-mapped rather than read, so opening a book costs the same
+    whatever its size and lookups only touch the pages they bisect.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+
+        with open(path, "rb") as book_file:
+            self.map = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(
+                "{} is not a version {} opening book.".format(path, VERSION)
+            )
+
+    def __len__(self):
+
+        return self.size
+
+    def __getstate__(self):
+
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+
+        self.__init__(state["path"])
+
+    def lookup(self, key, mirrored=False):
+        """Binary searches the book for a canonical position key
+
+        Positions are stored once for both themselves and their mirror image,
+        see `BitBoard.canonical_key`; `mirrored` maps the move back.
+
+        Returns:
+            tuple -- (best column counted from 1, util) or None if the position is not in the book
+        """
+
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * RECORD.size
+            (middle_key,) = KEY.unpack_from(self.map, offset)
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                _, move, score = RECORD.unpack_from(self.map, offset)
+                if mirrored:
+                    move = mirror_move(move)
+                return move, score
+
+        return None
+
+    def close(self):
+
+        self.map.close()
+
+
+def write_book(path, entries):
+    """Writes a {key: (move, score)} dict as a book file"""
+
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for key in sorted(entries):
+            move, score = entries[key]
+            book_file.write(RECORD.pack(key, move, score))
+
+
+def generate_book(path, plies, player1, player2):
+    """Searches every position with at most `plies` discs and writes the results as a book
+
+    `player1` and `player2` must offer a `search(connect4_board)` method returning
+    (move, util), like MiniMaxPlayer does; each of them searches the positions where
+    it is to move. Positions that are already won are left out.
+
+    Returns:
+        int -- number of positions in the book
+    """
+
+    connect4_board = ConnectFourBoard(player1=player1, player2=player2)
+    entries = {}
+
+    def visit():
+
+        key, mirrored = connect4_board.bitboard.canonical_key()
+        if key in entries or connect4_board.is_finished() or connect4_board.is_full():
+            return
+
+        move, score = connect4_board.current_player.search(connect4_board)
+        entries[key] = (mirror_move(move) if mirrored else move, score)
+        if len(entries) % 100 == 0:
+            logger.bind(verbose=True).info(
+                "{} book positions searched".format(len(entries))
+            )
+
+        if connect4_board.bitboard.moves < plies:
+            for move in range(1, WIDTH + 1):
+                if connect4_board.is_valid(move):
+                    connect4_board.make_move(move)
+                    connect4_board.toggle_players()
+                    visit()
+                    connect4_board.toggle_players()
+                    connect4_board.undo_move()
+
+    visit()
+    write_book(path, entries)
+
+    return len(entries)
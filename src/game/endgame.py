@@ -0,0 +1,190 @@
+import mmap
+import struct
+
+from loguru import logger
+
+from game.bitboard import WIDTH, alignment, mirror_move
+from game.solver import CELLS, COLUMN_ORDER
+
+MAGIC = b"C4EG"
+VERSION = 2
+
+# magic, version, most empty cells of a stored position, log2 of the number of
+# slots, number of positions
+HEADER = struct.Struct("<4sHBBI")
+# canonical position key (0 for an empty slot), best column of the canonical
+# position counted from 1, exact score
+SLOT = struct.Struct("<QBb")
+
+# Fibonacci hashing spreads the keys, whose low bits are mostly the same
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+
+# util a search gives a position won for sure, times its score: it outweighs
+# any heuristic util, and quicker wins weigh more
+WIN_UTIL = 1024**4
+
+
+class EndgameDatabase(object):
+    """
+    Read-only view of a file written by `generate_endgame`
+
+    The file is a header followed by an open addressing hash table of the
+    exact Solver scores of positions with few empty cells, with linear
+    probing and at most half of its slots used. Like OpeningBook, it is
+    memory-mapped, so a probe costs a hash and a slot or two read from the
+    page cache, cheap enough for every node of a search.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+
+        with open(path, "rb") as endgame_file:
+            self.map = mmap.mmap(endgame_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.max_empty, self.bits, self.size = HEADER.unpack_from(
+            self.map, 0
+        )
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(
+                "{} is not a version {} endgame database.".format(path, VERSION)
+            )
+        self.slots = 1 << self.bits
+        # positions with fewer discs can't be in the database
+        self.min_moves = CELLS - self.max_empty
+
+    def __len__(self):
+
+        return self.size
+
+    def __getstate__(self):
+
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+
+        self.__init__(state["path"])
+
+    def probe(self, key, mirrored=False):
+        """Looks a canonical position key up
+
+        Positions are stored once for both themselves and their mirror image,
+        see `BitBoard.canonical_key`; `mirrored` maps the move back.
+
+        Returns:
+            tuple -- (best column counted from 1, exact score of the position
+                     for its player to move) or None if it is not stored
+        """
+
+        slot = _slot(key, self.bits)
+        while True:
+            stored, move, score = SLOT.unpack_from(
+                self.map, HEADER.size + slot * SLOT.size
+            )
+            if stored == key:
+                return mirror_move(move) if mirrored else move, score
+            if stored == 0:
+                return None
+            slot = (slot + 1) & (self.slots - 1)
+
+    def close(self):
+
+        self.map.close()
+
+
+def _slot(key, bits):
+
+    return ((key * HASH_MULTIPLIER) & HASH_MASK) >> (64 - bits)
+
+
+def write_endgame(path, entries, max_empty):
+    """Writes a {key: (move, score)} dict as an endgame database file"""
+
+    bits = 1
+    while (1 << bits) < 2 * len(entries):
+        bits += 1
+    slots = 1 << bits
+
+    table = bytearray(slots * SLOT.size)
+    for key, (move, score) in entries.items():
+        slot = _slot(key, bits)
+        while SLOT.unpack_from(table, slot * SLOT.size)[0] != 0:
+            slot = (slot + 1) & (slots - 1)
+        SLOT.pack_into(table, slot * SLOT.size, key, move, score)
+
+    with open(path, "wb") as endgame_file:
+        endgame_file.write(HEADER.pack(MAGIC, VERSION, max_empty, bits, len(entries)))
+        endgame_file.write(table)
+
+
+def generate_endgame(path, seeds, max_empty):
+    """Solves every position with at most `max_empty` empty cells reachable from the seeds
+
+    Seeds with more empty cells are expanded through all their continuations
+    first, so they should be close to `max_empty`; see
+    `game.savefile.load_positions` to take seeds from the games saved.
+    Every position is scored on the Solver's scale by a full negamax over
+    its continuations, all of which get stored along the way. Positions that
+    are already won are left out.
+
+    Arguments:
+        seeds -- iterable of BitBoards, played on and restored
+
+    Returns:
+        int -- number of positions in the database
+    """
+
+    entries = {}
+
+    def solve(bitboard):
+
+        key, mirrored = bitboard.canonical_key()
+        if key in entries:
+            return entries[key][1]
+        if bitboard.moves == CELLS:
+            return 0
+
+        b_move = b_score = None
+        for col in COLUMN_ORDER:
+            if not bitboard.can_play(col):
+                continue
+            if bitboard.is_winning_move(col):
+                # the game ends here, nothing below is reachable
+                score = (CELLS + 1 - bitboard.moves) // 2
+            else:
+                bitboard.play(col)
+                score = -solve(bitboard)
+                bitboard.undo(col)
+            if b_score is None or score > b_score:
+                b_move, b_score = col + 1, score
+
+        entries[key] = (mirror_move(b_move) if mirrored else b_move, b_score)
+        if len(entries) % 10000 == 0:
+            logger.bind(verbose=True).info(
+                "{} endgame positions solved".format(len(entries))
+            )
+
+        return b_score
+
+    def expand(bitboard):
+
+        if CELLS - bitboard.moves <= max_empty:
+            solve(bitboard)
+            return
+
+        for col in range(WIDTH):
+            if bitboard.can_play(col) and not bitboard.is_winning_move(col):
+                bitboard.play(col)
+                expand(bitboard)
+                bitboard.undo(col)
+
+    for bitboard in seeds:
+        # the player who moved last has already won
+        if not alignment(bitboard.position ^ bitboard.mask):
+            expand(bitboard)
+
+    write_endgame(path, entries, max_empty)
+
+    return len(entries)
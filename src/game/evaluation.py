@@ -0,0 +1,274 @@
+import numpy as np
+
+from game.bitboard import (
+    BOARD_MASK,
+    DIRECTIONS,
+    H1,
+    HEIGHT,
+    WIDTH,
+    count_streaks,
+    popcount,
+)
+
+# weights of the util function, see README.md
+STREAK_4 = 1024 * 1024
+STREAK_3 = 1024
+STREAK_2 = 1
+OPPONENT_STREAK_4 = -1024 * 1024 * 1024
+
+
+def streak_counts(bits):
+    """Counts the streaks of 2, 3 and 4 of the given stones in a single pass
+
+    Each direction's streaks of 3 are built from its streaks of 2 and its
+    streaks of 4 from its streaks of 3, so no shift is computed twice.
+
+    Returns:
+        tuple -- (streaks of 2, streaks of 3, streaks of 4)
+    """
+
+    streaks_2 = streaks_3 = streaks_4 = 0
+
+    for direction in DIRECTIONS:
+        m = bits & (bits >> direction)
+        streaks_2 += popcount(m)
+        m &= bits >> (2 * direction)
+        streaks_3 += popcount(m)
+        m &= bits >> (3 * direction)
+        streaks_4 += popcount(m)
+
+    return streaks_2, streaks_3, streaks_4
+
+
+def utility(own, enemy):
+    """Util function of the position, from the point of view of the owner of `own`"""
+
+    p2streaks, p3streaks, p4streaks = streak_counts(own)
+    e4streaks = count_streaks(enemy, 4)
+
+    return (
+        STREAK_4 * p4streaks
+        + STREAK_3 * p3streaks
+        + STREAK_2 * p2streaks
+        + OPPONENT_STREAK_4 * e4streaks
+    )
+
+
+def _ray(cell, step):
+    """Bits of the up to 3 cells next to `cell` in steps of `step`, nearest first"""
+
+    bits = []
+    for distance in range(1, 4):
+        neighbour = cell + distance * step
+        if not 0 <= neighbour < WIDTH * H1 or not BOARD_MASK >> neighbour & 1:
+            break
+        bits.append(1 << neighbour)
+    return bits
+
+
+# for every bit index, the cells behind and ahead of it in each direction
+RAYS = [
+    [(_ray(cell, -direction), _ray(cell, direction)) for direction in DIRECTIONS]
+    for cell in range(WIDTH * H1)
+]
+
+# streaks of 2, 3 and 4 a stone joins, by the stones already in line behind and
+# ahead of it
+NEW_STREAKS = {
+    (behind, ahead): tuple(
+        max(0, min(0, ahead - streak + 1) - max(-behind, -streak + 1) + 1)
+        for streak in (2, 3, 4)
+    )
+    for behind in range(4)
+    for ahead in range(4)
+}
+
+
+def streak_delta(bits, cell):
+    """Counts the streaks of 2, 3 and 4 placing a stone on `cell` adds to `bits`
+
+    Only the lines through the cell are looked at, so this is what
+    `streak_counts(bits | 1 << cell)` minus `streak_counts(bits)` would be,
+    without counting the whole board twice.
+
+    Returns:
+        tuple -- (streaks of 2, streaks of 3, streaks of 4)
+    """
+
+    streaks_2 = streaks_3 = streaks_4 = 0
+
+    for behind_bits, ahead_bits in RAYS[cell]:
+        behind = 0
+        for bit in behind_bits:
+            if not bits & bit:
+                break
+            behind += 1
+        ahead = 0
+        for bit in ahead_bits:
+            if not bits & bit:
+                break
+            ahead += 1
+
+        if behind or ahead:
+            new_2, new_3, new_4 = NEW_STREAKS[behind, ahead]
+            streaks_2 += new_2
+            streaks_3 += new_3
+            streaks_4 += new_4
+
+    return streaks_2, streaks_3, streaks_4
+
+
+class StreakCounts(object):
+    """
+    Streaks of 2, 3 and 4 of both players, kept up to date move by move
+
+    ConnectFourBoard calls `play` and `undo` with every move it makes and
+    takes back while it keeps these, so only the lines through the cell of
+    the move are counted again and `utility` is a read of the counters
+    rather than a count of the whole board.
+    """
+
+    def __init__(self, bitboard):
+
+        # streaks of 2, 3 and 4 by player number, index 0 is unused
+        self.counts = [
+            None,
+            list(streak_counts(bitboard.stones(1))),
+            list(streak_counts(bitboard.stones(2))),
+        ]
+        self.stack = []  # (player no, streaks the move added)
+
+    def play(self, bitboard, col):
+        """Counts the streaks of a move, called before it is played on `bitboard`"""
+
+        player_no = bitboard.player_no
+        delta = streak_delta(bitboard.position, col * H1 + bitboard.heights[col])
+
+        counts = self.counts[player_no]
+        counts[0] += delta[0]
+        counts[1] += delta[1]
+        counts[2] += delta[2]
+        self.stack.append((player_no, delta))
+
+    def undo(self):
+
+        player_no, delta = self.stack.pop()
+
+        counts = self.counts[player_no]
+        counts[0] -= delta[0]
+        counts[1] -= delta[1]
+        counts[2] -= delta[2]
+
+    def utility(self, player_no):
+        """Same as `utility` of the stones of `player_no` and their opponent's"""
+
+        streaks_2, streaks_3, streaks_4 = self.counts[player_no]
+
+        return (
+            STREAK_4 * streaks_4
+            + STREAK_3 * streaks_3
+            + STREAK_2 * streaks_2
+            + OPPONENT_STREAK_4 * self.counts[3 - player_no][2]
+        )
+
+    def child_utility(self, bitboard, col, player_no):
+        """What `utility(player_no)` would return once `col` is played on `bitboard`"""
+
+        mover = bitboard.player_no
+        delta = streak_delta(bitboard.position, col * H1 + bitboard.heights[col])
+        streaks_2, streaks_3, streaks_4 = self.counts[player_no]
+        enemy_streaks_4 = self.counts[3 - player_no][2]
+
+        if mover == player_no:
+            streaks_2 += delta[0]
+            streaks_3 += delta[1]
+            streaks_4 += delta[2]
+        else:
+            enemy_streaks_4 += delta[2]
+
+        return (
+            STREAK_4 * streaks_4
+            + STREAK_3 * streaks_3
+            + STREAK_2 * streaks_2
+            + OPPONENT_STREAK_4 * enemy_streaks_4
+        )
+
+
+# bitboard bit of every cell of a `current_grid_state` grid
+CELL_BITS = np.array(
+    [
+        [1 << (col * H1 + HEIGHT - 1 - row) for col in range(WIDTH)]
+        for row in range(HEIGHT)
+    ],
+    dtype=np.uint64,
+)
+
+if hasattr(np, "bitwise_count"):  # NumPy 2.0+
+    batch_popcount = np.bitwise_count
+else:
+    BYTE_POPCOUNTS = np.array([popcount(byte) for byte in range(256)], dtype=np.uint8)
+
+    def batch_popcount(bits):
+
+        bits = np.ascontiguousarray(bits, dtype=np.uint64)
+        return BYTE_POPCOUNTS[bits.view(np.uint8)].reshape(bits.shape + (8,)).sum(-1)
+
+
+def grids_to_bitboards(grids, player_no):
+    """Converts a stack of grids of shape (N, 6, 7) into the N bitboards of a player"""
+
+    grids = np.asarray(grids)
+    return np.where(grids == player_no, CELL_BITS, np.uint64(0)).sum(
+        axis=(-2, -1), dtype=np.uint64
+    )
+
+
+def batch_streak_counts(bits):
+    """Same as streak_counts, for an array of bitboards"""
+
+    bits = np.asarray(bits, dtype=np.uint64)
+    streaks_2 = np.zeros(bits.shape, dtype=np.int64)
+    streaks_3 = np.zeros(bits.shape, dtype=np.int64)
+    streaks_4 = np.zeros(bits.shape, dtype=np.int64)
+
+    for direction in DIRECTIONS:
+        m = bits & (bits >> np.uint64(direction))
+        streaks_2 += batch_popcount(m)
+        m &= bits >> np.uint64(2 * direction)
+        streaks_3 += batch_popcount(m)
+        m &= bits >> np.uint64(3 * direction)
+        streaks_4 += batch_popcount(m)
+
+    return streaks_2, streaks_3, streaks_4
+
+
+def batch_utility_bits(own, enemy):
+    """Same as utility, for arrays of bitboards"""
+
+    p2streaks, p3streaks, p4streaks = batch_streak_counts(own)
+    _, _, e4streaks = batch_streak_counts(enemy)
+
+    return (
+        STREAK_4 * p4streaks
+        + STREAK_3 * p3streaks
+        + STREAK_2 * p2streaks
+        + OPPONENT_STREAK_4 * e4streaks
+    )
+
+
+def batch_utility(grids, player_no, enemy_no=None):
+    """Util function of N positions at once, from the point of view of `player_no`
+
+    Arguments:
+        grids -- array of shape (N, 6, 7), laid out like `current_grid_state`
+
+    Returns:
+        numpy.ndarray -- N utils, as int64
+    """
+
+    if enemy_no is None:
+        enemy_no = 3 - player_no
+
+    return batch_utility_bits(
+        grids_to_bitboards(grids, player_no), grids_to_bitboards(grids, enemy_no)
+    )
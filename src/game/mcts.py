@@ -0,0 +1,268 @@
+import datetime
+import math
+
+import numpy as np
+
+from game.bitboard import (
+    BOARD_MASK,
+    DIRECTIONS,
+    WIDTH,
+    alignment,
+    bottom_mask,
+    column_mask,
+    top_mask,
+)
+
+# UCT exploration constant, sqrt(2) suits results between 0 and 1
+EXPLORATION = math.sqrt(2)
+
+TOP_MASKS = np.array([top_mask(col) for col in range(WIDTH)], dtype=np.uint64)
+BOTTOM_MASKS = np.array([bottom_mask(col) for col in range(WIDTH)], dtype=np.uint64)
+COLUMN_MASKS = np.array([column_mask(col) for col in range(WIDTH)], dtype=np.uint64)
+
+WIN = 1.0
+DRAW = 0.5
+
+
+def batch_alignment(bits):
+    """Same as alignment, for an array of bitboards
+
+    Returns:
+        numpy.ndarray -- N bools, True where there is at least one line of four
+    """
+
+    found = np.zeros(bits.shape, dtype=bool)
+
+    for direction in DIRECTIONS:
+        m = bits & (bits >> np.uint64(direction))
+        found |= (m & (m >> np.uint64(2 * direction))) != 0
+
+    return found
+
+
+def batch_playouts(position, mask, rng):
+    """Plays N random games out from N positions at once
+
+    Every step drops one random disc into every game still going, so all the
+    games advance together, as one stack of bitboards.
+
+    Arguments:
+        position -- array of the stones of the player to move, as in BitBoard
+        mask -- array of all stones, as in BitBoard
+        rng -- numpy.random.Generator the moves are drawn from
+
+    Returns:
+        numpy.ndarray -- result of every game for the player to move at its
+                         start: WIN, DRAW, or 0 for a loss
+    """
+
+    position = np.array(position, dtype=np.uint64)
+    mask = np.array(mask, dtype=np.uint64)
+    results = np.full(position.shape, DRAW)
+    going = np.arange(len(position))
+    starting_player = True
+
+    while len(going):
+        legal = (mask[going][:, None] & TOP_MASKS) == 0
+        playable = legal.any(axis=1)
+        going, legal = going[playable], legal[playable]
+        if not len(going):
+            break
+
+        cols = np.where(legal, rng.random(legal.shape), -1.0).argmax(axis=1)
+        stones = position[going] ^ mask[going]  # the opponent's, who moves next
+        played = mask[going] | ((mask[going] + BOTTOM_MASKS[cols]) & COLUMN_MASKS[cols])
+        position[going] = stones
+        mask[going] = played
+
+        won = batch_alignment(stones ^ played)
+        results[going[won]] = WIN if starting_player else 0.0
+        going = going[~won]
+        starting_player = not starting_player
+
+    return results
+
+
+class Node(object):
+    """
+    A position of the search tree
+
+    `wins` and `visits` count the playouts through the node, wins from the
+    point of view of the player who played `move` into it. `result` is the
+    outcome of the game for that player if the move ended it, None otherwise.
+    """
+
+    __slots__ = (
+        "position",
+        "mask",
+        "move",
+        "parent",
+        "children",
+        "untried",
+        "visits",
+        "wins",
+        "result",
+    )
+
+    def __init__(self, position, mask, move=None, parent=None, result=None):
+
+        self.position = position
+        self.mask = mask
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+        self.result = result
+
+        if result is None:
+            self.untried = [col + 1 for col in range(WIDTH) if not mask & top_mask(col)]
+        else:
+            self.untried = []
+
+    def expand(self, move):
+
+        col = move - 1
+        stone = (self.mask + bottom_mask(col)) & column_mask(col)
+        mask = self.mask | stone
+
+        if alignment(self.position | stone):
+            result = WIN
+        elif mask == BOARD_MASK:
+            result = DRAW
+        else:
+            result = None
+
+        child = Node(self.position ^ self.mask, mask, move, self, result)
+        self.untried.remove(move)
+        self.children.append(child)
+        return child
+
+
+class MonteCarloTreeSearch(object):
+    """
+    UCT search of connect four positions with batched random playouts
+
+    Leaves are selected `batch_size` at a time, every selection counting as a
+    lost visit along its path until its playout is backed up, which steers the
+    following selections of the batch elsewhere. The playouts of the whole
+    batch are then played at once, see `batch_playouts`.
+    The tree is kept between searches: `set_position` moves the root down to
+    the position reached since, so its subtree is searched on rather than
+    anew.
+    """
+
+    def __init__(self, batch_size=64, exploration=EXPLORATION, seed=None):
+
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self.rng = np.random.default_rng(seed)
+        self.root = None
+        self.playouts = 0
+
+    def set_position(self, position, mask):
+        """Roots the tree at the position, reusing the subtree already searched for it
+
+        The position is looked for among the root and the two plies below it,
+        which covers our last move and the opponent's reply.
+
+        Returns:
+            bool -- True if a subtree was reused
+        """
+
+        if self.root is not None:
+            candidates = [self.root]
+            for child in self.root.children:
+                candidates.append(child)
+                candidates.extend(child.children)
+            for node in candidates:
+                if node.position == position and node.mask == mask:
+                    node.parent = None
+                    node.move = None
+                    self.root = node
+                    return True
+
+        self.root = Node(position, mask)
+        return False
+
+    def search(self, iterations=None, deadline=None):
+        """Runs playouts from the root until either budget is spent
+
+        One batch is always played, however little time is left, so a full
+        batch tries every move of the root at least once. No batch goes past
+        `iterations`, the first one included.
+
+        Arguments:
+            iterations -- number of playouts, None for no limit
+            deadline -- datetime after which no new batch is started, None for no limit
+        """
+
+        self.playouts = 0
+
+        while not self.playouts or (
+            (iterations is None or self.playouts < iterations)
+            and (deadline is None or datetime.datetime.now() < deadline)
+        ):
+            batch_size = self.batch_size
+            if iterations is not None:
+                batch_size = max(min(batch_size, iterations - self.playouts), 1)
+            self._search_batch(batch_size)
+            self.playouts += batch_size
+
+    def _search_batch(self, batch_size):
+
+        leaves = [self._select() for _ in range(batch_size)]
+
+        played = [leaf for leaf in leaves if leaf.result is None]
+        outcomes = iter(())
+        if played:
+            outcomes = iter(
+                batch_playouts(
+                    [leaf.position for leaf in played],
+                    [leaf.mask for leaf in played],
+                    self.rng,
+                )
+            )
+
+        for leaf in leaves:
+            if leaf.result is None:
+                # the playout's result is for the player to move at the leaf
+                value = 1.0 - float(next(outcomes))
+            else:
+                value = leaf.result
+            node = leaf
+            while node is not None:
+                node.wins += value
+                value = 1.0 - value
+                node = node.parent
+
+    def _select(self):
+
+        node = self.root
+        node.visits += 1
+
+        while node.result is None:
+            if node.untried:
+                move = node.untried[self.rng.integers(len(node.untried))]
+                node = node.expand(move)
+                node.visits += 1
+                break
+
+            log_visits = math.log(node.visits)
+            node = max(
+                node.children,
+                key=lambda child: child.wins / child.visits
+                + self.exploration * math.sqrt(log_visits / child.visits),
+            )
+            node.visits += 1
+
+        return node
+
+    def root_stats(self):
+        """Visits and wins of every move of the root
+
+        Returns:
+            dict -- {column counted from 1: (visits, wins)}
+        """
+
+        return {child.move: (child.visits, child.wins) for child in self.root.children}
@@ -0,0 +1,149 @@
+from game.bitboard import (
+    BOARD_MASK,
+    BOTTOM_MASK,
+    H1,
+    HEIGHT,
+    WIDTH,
+    winning_cells,
+)
+from game.stats import MAX_DEPTH
+
+# columns counted from 1, center first: they take part in the most lines of four
+CENTER_ORDER = sorted(
+    range(1, WIDTH + 1), key=lambda move: abs((WIDTH + 1) // 2 - move)
+)
+
+# move priorities, lower ones are searched first
+WIN, BLOCK, TT_MOVE, KILLER, QUIET = range(5)
+
+
+class MoveOrdering(object):
+    """
+    Decides in which order MiniMaxPlayer searches the moves of a node
+
+    Moves are tried center first and then reordered by, in turn:
+    moves that win at once and moves that block an immediate win of the
+    opponent (`threats`), the best move stored in the transposition table,
+    the two moves that last caused a cutoff at the same ply (`killers`), and
+    how much cutoffs each player's move into a cell caused so far (`history`).
+    Every heuristic can be turned off to fall back to the static order. The
+    history is off by default: at the depths the difficulties search to, it
+    pulls moves away from the center more often than it finds better ones.
+    """
+
+    def __init__(self, threats=True, killers=True, history=False):
+
+        self.threats = threats
+        self.use_killers = killers
+        self.use_history = history
+
+        self.killers = [[None, None] for _ in range(MAX_DEPTH)]
+        # one table per player, indexed by bit index of the cell moved into
+        self.history = [[0] * (WIDTH * H1) for _ in range(2)]
+
+        # cutoffs by rank of the move that caused them, 0 is the first move tried
+        self.cutoff_ranks = [0] * WIDTH
+
+    def new_search(self):
+        """Forgets the killers, whose plies shift between moves, and ages the history"""
+
+        self.killers = [[None, None] for _ in range(MAX_DEPTH)]
+        for table in self.history:
+            for cell in range(len(table)):
+                table[cell] >>= 1
+        self.cutoff_ranks = [0] * WIDTH
+
+    def order(self, bitboard, depth, tt_move=None):
+        """Lists the playable moves of a BitBoard, the most promising first
+
+        Returns:
+            list -- columns counted from 1
+        """
+
+        heights = bitboard.heights
+        position = bitboard.position
+        mask = bitboard.mask
+
+        if self.threats:
+            possible = (mask + BOTTOM_MASK) & BOARD_MASK
+            wins = winning_cells(position, mask) & possible
+            blocks = winning_cells(position ^ mask, mask) & possible
+        else:
+            wins = blocks = 0
+
+        killers = self.killers[depth] if self.use_killers else ()
+        history = self.history[bitboard.player_no - 1] if self.use_history else None
+
+        # (priority, -history, rank in the center first order, move) sorts best first
+        keyed = []
+        for rank, move in enumerate(CENTER_ORDER):
+            height = heights[move - 1]
+            if height == HEIGHT:
+                continue
+            cell = (move - 1) * H1 + height
+            score = 0
+            if wins >> cell & 1:
+                priority = WIN
+            elif blocks >> cell & 1:
+                priority = BLOCK
+            elif move == tt_move:
+                priority = TT_MOVE
+            elif move in killers:
+                priority = KILLER
+            else:
+                priority = QUIET
+                if history is not None:
+                    score = -history[cell]
+            keyed.append((priority, score, rank, move))
+        keyed.sort()
+
+        return [move for _, _, _, move in keyed]
+
+    def cutoff(self, bitboard, depth, move, rank, remaining_depth):
+        """Records that `move` of the position on `bitboard` caused a cutoff"""
+
+        self.cutoff_ranks[rank] += 1
+
+        if self.use_killers:
+            killers = self.killers[depth]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+        if self.use_history:
+            cell = (move - 1) * H1 + bitboard.heights[move - 1]
+            self.history[bitboard.player_no - 1][cell] += (
+                remaining_depth * remaining_depth
+            )
+
+
+def parse_ordering(heuristics):
+    """Builds a MoveOrdering from a comma separated list, e.g. `threats,killers`
+
+    Only the listed heuristics are used; an empty list keeps the static order.
+    """
+
+    names = set(name for name in heuristics.split(",") if name)
+    unknown = names - {"threats", "killers", "history"}
+    if unknown:
+        raise ValueError("Unknown move ordering heuristics: {}".format(unknown))
+
+    return MoveOrdering(
+        threats="threats" in names,
+        killers="killers" in names,
+        history="history" in names,
+    )
+
+
+def format_ordering(ordering):
+    """Lists the heuristics of a MoveOrdering the way parse_ordering reads them"""
+
+    return ",".join(
+        name
+        for name, used in (
+            ("threats", ordering.threats),
+            ("killers", ordering.use_killers),
+            ("history", ordering.use_history),
+        )
+        if used
+    )
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import ujson as json
+
+from game.bitboard import BitBoard
+from game.board import ConnectFourBoard
+
+FORMAT = "connect4-save"
+VERSION = 1
+
+
+def save_game(path, connect4_board):
+    """Writes a game to a single JSON file
+
+    The file holds the moves played, in columns counted from 1, on top of the
+    grid the game started from (null for the empty grid), whose turn it is
+    and the config of both players, see `Player.config`, from which loading
+    rebuilds them. It is written next to `path` first and moved over it, so
+    a failed save never leaves half a file behind.
+    """
+
+    start = connect4_board.bitboard.copy()
+    for _, col, _ in reversed(connect4_board.move_stack):
+        start.undo(col)
+
+    save = {
+        "format": FORMAT,
+        "version": VERSION,
+        "start": start.to_grid().tolist() if start.mask else None,
+        "moves": [col + 1 for _, col, _ in connect4_board.move_stack],
+        "current_player": connect4_board.current_player.no,
+        "players": [
+            connect4_board.player1.config(),
+            connect4_board.player2.config(),
+        ],
+    }
+
+    with open(path + ".tmp", "w") as save_file:
+        json.dump(save, save_file)
+    os.replace(path + ".tmp", path)
+
+
+def read_game(path):
+    """Reads a file written by `save_game`
+
+    Returns:
+        dict -- the save, as described in `save_game`
+    """
+
+    with open(path) as save_file:
+        save = json.load(save_file)
+
+    if (
+        not isinstance(save, dict)
+        or save.get("format") != FORMAT
+        or save.get("version") != VERSION
+    ):
+        raise ValueError("{} is not a version {} save file.".format(path, VERSION))
+
+    return save
+
+
+def load_game(save, player1, player2):
+    """Sets up the board of a save read by `read_game` for the given players
+
+    Returns:
+        ConnectFourBoard -- ready for its game loop
+    """
+
+    initial_state = None
+    if save["start"] is not None:
+        initial_state = np.array(save["start"], dtype=int)
+
+    connect4_board = ConnectFourBoard(
+        player1=player1,
+        player2=player2,
+        current_player=player1 if save["current_player"] == 1 else player2,
+        initial_state=initial_state,
+    )
+    for move in save["moves"]:
+        connect4_board.make_move(move)
+        connect4_board.latest_move = move
+
+    return connect4_board
+
+
+def load_positions(paths, max_moves=None):
+    """Reads the final position of many saves, e.g. for analysis jobs
+
+    Only the moves are replayed, on a bare BitBoard, without building the
+    players or a ConnectFourBoard, so thousands of saves load in well under
+    a second. With `max_moves`, replaying stops once that many discs are on
+    the board, e.g. to find the endgames the saved games went through.
+
+    Yields:
+        tuple -- (path, BitBoard)
+    """
+
+    for path in paths:
+        save = read_game(path)
+
+        if save["start"] is None:
+            bitboard = BitBoard()
+        else:
+            bitboard = BitBoard.from_grid(save["start"])
+        for move in save["moves"]:
+            if bitboard.moves == max_moves:
+                break
+            bitboard.play(move - 1)
+
+        yield path, bitboard
@@ -0,0 +1,450 @@
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import os
+
+from gevent.event import Event
+from gevent.server import DatagramServer
+from gevent.threadpool import ThreadPool
+from loguru import logger
+import gevent
+import numpy as np
+import ujson as json
+
+from game import wire
+from game.agents import MiniMaxPlayer, NetworkPlayer, Player
+from game.bitboard import BitBoard
+from game.board import ConnectFourBoard
+
+Data = NetworkPlayer.Data
+
+# seconds without a message after which a session is dropped
+SESSION_TIMEOUT = 600
+
+
+class Session(object):
+    """
+    One match between a remote client and a server-side AI
+
+    The client plays the side that moves first if its first message carries
+    a move, and the second side if that move is empty, like the first
+    message of a NetworkPlayer whose own side moves first.
+    """
+
+    def __init__(self, session_id, address, client_no):
+
+        self.session_id = session_id
+        self.address = address
+        self.client_no = client_no
+        self.ai_no = 3 - client_no
+        self.connect4_board = ConnectFourBoard(
+            player1=Player(no=1), player2=Player(no=2)
+        )
+
+        self.sent_seq = 0
+        self.recieved_seq = 0
+        self.acks = {}  # seq: Event set once the client acknowledged it
+        self.peer_acks = False
+        self.peer_binary = False
+        self.peer_delta = False
+        self.latest_recieved_board = None
+        self.latest_sent_message = [{"type": Data.Null.value, "content": None}]
+
+        self.finished = False
+        self.thinking = False
+        # waiting for the client's board after its move didn't match its checksum
+        self.resyncing = False
+        self.last_seen = datetime.datetime.now()
+
+
+class GameServer(DatagramServer):
+    """
+    Hosts any number of concurrent matches against AIs on a single UDP socket
+
+    Clients speak the NetworkPlayer protocol, in JSON or game.wire's binary
+    format once they offer it, and without boards once they offer that.
+    Their messages are routed to a session by the "session" key of their
+    elements, or by their address for clients that don't send one, so a
+    plain NetworkPlayer can play too, one match per address and port.
+    The AIs' searches run on a pool of worker processes; the server itself
+    only waits for them, one greenlet per message, so a slow search holds up
+    its own match only.
+    """
+
+    def __init__(self, listener, settings, workers=None, **kwargs):
+
+        super(GameServer, self).__init__(listener, **kwargs)
+
+        self.settings = settings
+        self.sessions = {}
+
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_server_worker,
+            initargs=(settings,),
+        )
+        # threads that wait for the worker processes without blocking the hub
+        self.threadpool = ThreadPool(self.workers)
+
+    def serve_forever(self, *args, **kwargs):
+
+        # start the workers before serving, forking them from inside a
+        # request could fork while a greenlet holds a lock
+        for future in [self.executor.submit(int) for _ in range(self.workers)]:
+            future.result()
+
+        gevent.spawn(self._drop_idle_sessions)
+
+        super(GameServer, self).serve_forever(*args, **kwargs)
+
+    def handle(self, data, address):
+
+        logger.debug("Recieved {} from {}.".format(data, address))
+
+        try:
+            data, binary = wire.decode(data)
+            types = [Data(elm["type"]) for elm in data]
+        except:
+            logger.debug("Dropped a malformed message from {}.".format(address))
+            return
+
+        session_ids = [elm["session"] for elm in data if "session" in elm]
+        session_id = session_ids[0] if session_ids else "{}:{}".format(*address)
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            if Data.FinishedWin in types or Data.FinishedLose in types:
+                self._ack(data, address, session_id, binary)
+                return
+            moves = [elm["content"] for elm in data if elm["type"] == Data.Move.value]
+            if not moves:
+                return
+            session = Session(session_id, address, 1 if moves[0] is not None else 2)
+            self.sessions[session_id] = session
+            logger.bind(verbose=True).info(
+                "Session {} started, {} sessions running.".format(
+                    session_id, len(self.sessions)
+                )
+            )
+
+        session.address = address
+        session.last_seen = datetime.datetime.now()
+        if binary or any(elm.get("wire") == wire.OFFER for elm in data):
+            session.peer_binary = True
+        if any(elm.get("sync") == wire.SYNC_OFFER for elm in data):
+            session.peer_delta = True
+
+        if self._is_repeated(session, data):
+            logger.debug("Dropped a repeated message of session {}.".format(session_id))
+            return
+
+        move = checksum = None
+        for elm, data_type in zip(data, types):
+            if data_type is Data.Move:
+                move = elm["content"]
+                checksum = elm.get("checksum")
+            elif data_type is Data.Board:
+                session.latest_recieved_board = np.array(elm["content"], dtype=int)
+                if session.resyncing and len(data) == 1:
+                    self._adopt_board(session, session.latest_recieved_board)
+            elif data_type is Data.Resend:
+                self.send(session, session.latest_sent_message)
+            elif data_type is Data.ResendBoard:
+                self.send(
+                    session,
+                    [
+                        {
+                            "type": Data.Board.value,
+                            "content": session.connect4_board.current_grid_state.tolist(),
+                        }
+                    ],
+                )
+            elif data_type is Data.Null and "ack" in elm:
+                session.peer_acks = True
+                acked = session.acks.pop(elm["ack"], None)
+                if acked is not None:
+                    acked.set()
+            elif data_type is Data.Log:
+                logger.bind(verbose=True).info(
+                    "Session {}: ```{}```".format(session_id, elm["content"])
+                )
+
+        connect4_board = session.connect4_board
+        if (
+            move is not None
+            and not session.finished
+            and connect4_board.bitboard.player_no == session.client_no
+            and connect4_board.is_valid(move)
+        ):
+            connect4_board.make_move(move)
+            connect4_board.latest_move = move
+            if checksum is not None and connect4_board.bitboard.key() != checksum:
+                self._resync(session)
+                return
+            if self._game_over(session):
+                return
+
+        if (
+            not session.finished
+            and not session.resyncing
+            and not session.thinking
+            and connect4_board.bitboard.player_no == session.ai_no
+        ):
+            self._play_ai_move(session)
+
+    def _play_ai_move(self, session):
+
+        connect4_board = session.connect4_board
+        bitboard = connect4_board.bitboard
+        key = bitboard.key()
+
+        # only one search per session at a time
+        session.thinking = True
+        future = self.executor.submit(
+            _search_session,
+            session.ai_no,
+            bitboard.position,
+            bitboard.mask,
+            bitboard.moves,
+        )
+        move, util_value, nodes = self.threadpool.spawn(future.result).get()
+        session.thinking = False
+
+        # the match may have ended, timed out, or taken over the client's board
+        # while the worker was searching
+        if (
+            session.finished
+            or self.sessions.get(session.session_id) is not session
+            or connect4_board.bitboard.key() != key
+        ):
+            logger.debug(
+                "Session {}: dropped the AI's move, the match moved on.".format(
+                    session.session_id
+                )
+            )
+            return
+
+        logger.debug(
+            "Session {}: AI played column {} with util {} after {} nodes.".format(
+                session.session_id, move, util_value, nodes
+            )
+        )
+
+        connect4_board.make_move(move)
+        connect4_board.latest_move = move
+
+        message = [
+            {
+                "type": Data.Move.value,
+                "content": move,
+                "checksum": connect4_board.bitboard.key(),
+            }
+        ]
+        if not session.peer_delta:
+            message.append(
+                {
+                    "type": Data.Board.value,
+                    "content": connect4_board.current_grid_state.tolist(),
+                }
+            )
+        if connect4_board.is_finished():
+            message.insert(0, {"type": Data.FinishedWin.value, "content": None})
+        self._send_reliably(session, message)
+
+        self._game_over(session)
+
+    def _resync(self, session):
+        """Asks the client for its board, its last move didn't match its checksum"""
+
+        logger.bind(verbose=True).warning(
+            "Session {}: the board diverged from the client's, asking for theirs.".format(
+                session.session_id
+            )
+        )
+        session.resyncing = True
+        gevent.spawn(self._request_board, session)
+
+    def _request_board(self, session):
+
+        delay = NetworkPlayer.RETRANSMIT_DELAY
+
+        for _ in range(NetworkPlayer.MAX_RETRANSMITS):
+            if not session.resyncing or session.finished:
+                return
+            self.send(session, [{"type": Data.ResendBoard.value, "content": None}])
+            gevent.sleep(delay)
+            delay = min(2 * delay, NetworkPlayer.MAX_RETRANSMIT_DELAY)
+
+    def _adopt_board(self, session, grid):
+
+        connect4_board = session.connect4_board
+        connect4_board.current_grid_state = grid
+        session.resyncing = False
+        logger.debug(
+            "Session {}: took over the client's board.".format(session.session_id)
+        )
+
+        # the board starts over without a last disc, so the win is looked for
+        # by the player who made the last move
+        connect4_board.current_player = (
+            connect4_board.player2
+            if connect4_board.bitboard.player_no == 2
+            else connect4_board.player1
+        )
+        self._game_over(session)
+
+    def _game_over(self, session):
+
+        connect4_board = session.connect4_board
+        if not connect4_board.is_finished() and not connect4_board.is_full():
+            return False
+
+        session.finished = True
+        self.sessions.pop(session.session_id, None)
+        logger.bind(verbose=True).info(
+            "Session {} finished, {} sessions running.".format(
+                session.session_id, len(self.sessions)
+            )
+        )
+
+        return True
+
+    def _is_repeated(self, session, data):
+        """Acknowledges a numbered message and checks whether the session saw it before
+
+        Returns:
+            bool -- True if the message was already handled
+        """
+
+        seqs = [elm["seq"] for elm in data if "seq" in elm]
+
+        if seqs:
+            # a client numbering its messages acks ours too
+            session.peer_acks = True
+            self._ack(data, session.address, session.session_id, session.peer_binary)
+            if seqs[0] <= session.recieved_seq:
+                return True
+            session.recieved_seq = seqs[0]
+            return False
+
+        # a lone board answers a ResendBoard request and is always wanted
+        for elm in data if len(data) > 1 else ():
+            if (
+                elm["type"] == Data.Board.value
+                and session.latest_recieved_board is not None
+                and np.array_equal(session.latest_recieved_board, elm["content"])
+            ):
+                return True
+
+        return False
+
+    def _ack(self, data, address, session_id, binary):
+
+        seqs = [elm["seq"] for elm in data if "seq" in elm]
+        if seqs:
+            self._sendto(
+                [
+                    {
+                        "type": Data.Null.value,
+                        "content": None,
+                        "ack": seqs[0],
+                        "session": session_id,
+                    }
+                ],
+                address,
+                binary,
+            )
+
+    def send(self, session, data):
+
+        for elm in data:
+            elm["session"] = session.session_id
+        self._sendto(data, session.address, session.peer_binary)
+
+    def _sendto(self, data, address, binary):
+
+        data[0]["sync"] = wire.SYNC_OFFER
+        if binary:
+            self.sendto(wire.encode(data), address)
+        else:
+            data[0]["wire"] = wire.OFFER
+            self.sendto(json.dumps(data).encode(), address)
+
+    def _send_reliably(self, session, message):
+
+        session.sent_seq += 1
+        for elm in message:
+            elm["seq"] = session.sent_seq
+
+        acked = Event()
+        session.acks[session.sent_seq] = acked
+        session.latest_sent_message = message
+        self.send(session, message)
+
+        gevent.spawn(self._retransmit, session, message, acked)
+
+    def _retransmit(self, session, message, acked):
+
+        delay = NetworkPlayer.RETRANSMIT_DELAY
+
+        for _ in range(NetworkPlayer.MAX_RETRANSMITS):
+            if acked.wait(timeout=delay):
+                return
+            # clients that never ack would take a copy of a move for the next one
+            if session.peer_acks:
+                self.send(session, message)
+            delay = min(2 * delay, NetworkPlayer.MAX_RETRANSMIT_DELAY)
+
+    def _drop_idle_sessions(self):
+
+        while True:
+            gevent.sleep(SESSION_TIMEOUT / 10)
+            deadline = datetime.datetime.now() - datetime.timedelta(
+                seconds=SESSION_TIMEOUT
+            )
+            for session_id, session in list(self.sessions.items()):
+                if session.last_seen < deadline:
+                    logger.bind(verbose=True).info(
+                        "Session {} timed out.".format(session_id)
+                    )
+                    session.finished = True
+                    del self.sessions[session_id]
+
+
+# MiniMaxPlayers of a server worker process, one per side they play
+_server_players = {}
+_server_settings = None
+
+
+def _init_server_worker(settings):
+
+    global _server_settings
+
+    _server_settings = settings
+    _server_players.clear()
+
+
+def _search_session(no, position, mask, moves):
+    """Picks the AI's move of a session's position in a worker process
+
+    The players, and so their transposition tables, are shared by all the
+    sessions a worker searches for.
+
+    Returns:
+        tuple -- (column counted from 1, its util, nodes searched)
+    """
+
+    player = _server_players.get(no)
+    if player is None:
+        player = _server_players[no] = MiniMaxPlayer(no=no, **_server_settings)
+    opponent = Player(no=3 - no)
+
+    if no == 1:
+        connect4_board = ConnectFourBoard(player, opponent, current_player=player)
+    else:
+        connect4_board = ConnectFourBoard(opponent, player, current_player=player)
+    connect4_board.bitboard = BitBoard(position=position, mask=mask, moves=moves)
+
+    move, util_value = player.search(connect4_board)
+
+    return move, util_value, player.nodes
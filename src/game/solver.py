@@ -0,0 +1,182 @@
+import datetime
+
+from game.bitboard import (
+    BOARD_MASK,
+    BOTTOM_MASK,
+    H1,
+    HEIGHT,
+    WIDTH,
+    column_mask,
+    mirror,
+    popcount,
+    winning_cells,
+)
+
+CELLS = WIDTH * HEIGHT
+
+# center columns first
+COLUMN_ORDER = sorted(range(WIDTH), key=lambda col: abs(WIDTH // 2 - col))
+
+
+class SolverTimeout(Exception):
+
+    pass
+
+
+class Solver(object):
+    """
+    Perfect play connect four solver
+
+    Positions are scored with their exact game-theoretic value from the
+    point of view of the player to move: 0 for a draw, a positive score for
+    a win and a negative one for a loss. The sooner the game is won, the
+    higher the score; winning with one's last disc scores 1.
+    The search is a negamax with alpha-beta pruning, narrowed to null
+    windows by `solve`, ordering moves center first and by the number of
+    threats they create, storing upper bounds in a transposition table and
+    never exploring moves that hand the opponent a win.
+    """
+
+    def __init__(self, max_entries=250000):
+
+        self.max_entries = max_entries
+        self.transposition_table = {}
+        self.nodes = 0
+        self.deadline = None
+
+    def reset(self):
+        """Forgets the positions solved so far, e.g. once a game is over"""
+
+        self.transposition_table.clear()
+
+    def solve(self, position, mask, moves, deadline=None):
+        """Exact score of the position, see the class docstring for the scale
+
+        Arguments:
+            position -- stones of the player to move, as in BitBoard
+            mask -- all stones, as in BitBoard
+            moves -- number of discs played
+            deadline -- datetime after which SolverTimeout is raised
+        """
+
+        self.deadline = deadline
+
+        if winning_cells(position, mask) & (mask + BOTTOM_MASK) & BOARD_MASK:
+            return (CELLS + 1 - moves) // 2
+
+        low = -((CELLS - moves) // 2)
+        high = (CELLS + 1 - moves) // 2
+
+        # iteratively narrow the score window with null window searches
+        while low < high:
+            middle = low + (high - low) // 2
+            if middle <= 0 and -(-low // 2) < middle:
+                middle = -(-low // 2)
+            elif middle >= 0 and high // 2 > middle:
+                middle = high // 2
+            score = self._negamax(position, mask, moves, middle, middle + 1)
+            if score <= middle:
+                high = score
+            else:
+                low = score
+
+        return low
+
+    def analyze(self, bitboard, deadline=None):
+        """Scores every move of the player to move of a BitBoard
+
+        Returns:
+            dict -- {column counted from 1: exact score after playing it}
+        """
+
+        scores = {}
+
+        for col in COLUMN_ORDER:
+            if not bitboard.can_play(col):
+                continue
+            if bitboard.is_winning_move(col):
+                scores[col + 1] = (CELLS + 1 - bitboard.moves) // 2
+                continue
+            position = bitboard.position ^ bitboard.mask
+            mask = bitboard.mask | (1 << (col * H1 + bitboard.heights[col]))
+            scores[col + 1] = -self.solve(position, mask, bitboard.moves + 1, deadline)
+
+        return scores
+
+    def best_move(self, bitboard, deadline=None):
+        """Picks the move with the best exact score, preferring center columns
+
+        Returns:
+            tuple -- (column counted from 1, its exact score)
+        """
+
+        scores = self.analyze(bitboard, deadline)
+        move = max(scores, key=lambda move: scores[move])
+
+        return move, scores[move]
+
+    def _negamax(self, position, mask, moves, alpha, beta):
+
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % 4096 == 0:
+            if datetime.datetime.now() > self.deadline:
+                raise SolverTimeout
+
+        possible = (mask + BOTTOM_MASK) & BOARD_MASK
+        opponent_wins = winning_cells(position ^ mask, mask)
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):  # two threats can't both be blocked
+                return -((CELLS - moves) // 2)
+            possible = forced
+        # never play right below a cell where the opponent would win
+        non_losing = possible & ~(opponent_wins >> 1)
+        if not non_losing:
+            return -((CELLS - moves) // 2)
+
+        if moves >= CELLS - 2:  # nobody can win with the last two discs
+            return 0
+
+        low = -((CELLS - 2 - moves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+
+        high = (CELLS - 1 - moves) // 2
+        # a position scores the same as its mirror image
+        key = position + mask
+        mirrored = mirror(key)
+        if mirrored < key:
+            key = mirrored
+        upper = self.transposition_table.get(key)
+        if upper is not None:
+            high = upper
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # sort the candidate moves by the number of threats they create
+        candidates = []
+        for col in COLUMN_ORDER:
+            move = non_losing & column_mask(col)
+            if move:
+                threats = popcount(winning_cells(position | move, mask))
+                candidates.append((-threats, len(candidates), move))
+        candidates.sort()
+
+        for _, _, move in candidates:
+            score = -self._negamax(
+                position ^ mask, mask | move, moves + 1, -beta, -alpha
+            )
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        if len(self.transposition_table) >= self.max_entries:
+            self.transposition_table.clear()
+        self.transposition_table[key] = alpha
+
+        return alpha
@@ -0,0 +1,133 @@
+import datetime
+
+import ujson as json
+
+from game.bitboard import HEIGHT, WIDTH
+
+# a search never goes deeper than the number of cells
+MAX_DEPTH = WIDTH * HEIGHT + 1
+
+COUNTERS = (
+    "nodes",
+    "leaves",
+    "expanded",
+    "children",
+    "cutoffs",
+    "tt_hits",
+    "researches",
+)
+
+
+class SearchStats(object):
+    """
+    Counters of one MiniMaxPlayer search, kept per depth from the root
+
+    Every counter is a list of MAX_DEPTH ints allocated once, so recording a
+    node costs one increment rather than appending to an ever growing list:
+    `nodes` and `leaves` count the searched positions, `expanded` and
+    `children` the interior nodes and the moves searched below them,
+    `cutoffs` the nodes whose remaining moves were pruned, `tt_hits` the
+    positions found in the transposition table and `researches` the moves
+    a principal variation search had to search again after a null window.
+    """
+
+    def __init__(self):
+
+        for counter in COUNTERS:
+            setattr(self, counter, [0] * MAX_DEPTH)
+
+        # seconds spent on each completed iterative deepening depth
+        self.iterations = {}
+        self.seconds = 0.0
+        self._start = None
+
+    def reset(self):
+
+        self.__init__()
+
+    def start(self):
+
+        self._start = datetime.datetime.now()
+
+    def stop(self):
+
+        self.seconds += (datetime.datetime.now() - self._start).total_seconds()
+
+    def merge(self, other):
+        """Adds the counters of another SearchStats, e.g. a worker process' ones"""
+
+        for counter in COUNTERS:
+            mine = getattr(self, counter)
+            for depth, count in enumerate(getattr(other, counter)):
+                mine[depth] += count
+
+    def total(self, counter):
+
+        return sum(getattr(self, counter))
+
+    def branching_factor(self):
+
+        expanded = self.total("expanded")
+        return self.total("children") / expanded if expanded else 0.0
+
+    def to_dict(self):
+
+        # depths nothing was searched at are left out
+        depth = max(
+            (d for d in range(MAX_DEPTH) if self.nodes[d] or self.leaves[d]), default=0
+        )
+
+        return {
+            "seconds": self.seconds,
+            "branching_factor": self.branching_factor(),
+            "iterations": {str(d): s for d, s in sorted(self.iterations.items())},
+            "depths": {
+                counter: getattr(self, counter)[: depth + 1] for counter in COUNTERS
+            },
+        }
+
+    def to_json(self, labels=None):
+        """Dumps the counters as one line of JSON
+
+        Arguments:
+            labels -- dict of keys added next to the counters, e.g. {"player": 1}
+        """
+
+        return json.dumps(dict(labels or {}, stats=self.to_dict()))
+
+    def to_prometheus(self, labels=None):
+        """Dumps the counters in the Prometheus text exposition format
+
+        Arguments:
+            labels -- dict of labels added to every sample, e.g. {"player": 1}
+        """
+
+        labels = labels or {}
+
+        def sample(name, value, **extra):
+
+            pairs = ",".join(
+                '{}="{}"'.format(key, label)
+                for key, label in list(labels.items()) + list(extra.items())
+            )
+            if pairs:
+                return "connect4_search_{}{{{}}} {}".format(name, pairs, value)
+            return "connect4_search_{} {}".format(name, value)
+
+        stats = self.to_dict()
+        lines = []
+
+        for counter in COUNTERS:
+            lines.append("# TYPE connect4_search_{} gauge".format(counter))
+            for depth, count in enumerate(stats["depths"][counter]):
+                lines.append(sample(counter, count, depth=depth))
+
+        lines.append("# TYPE connect4_search_seconds gauge")
+        lines.append(sample("seconds", stats["seconds"]))
+        lines.append("# TYPE connect4_search_branching_factor gauge")
+        lines.append(sample("branching_factor", stats["branching_factor"]))
+        lines.append("# TYPE connect4_search_iteration_seconds gauge")
+        for depth, seconds in stats["iterations"].items():
+            lines.append(sample("iteration_seconds", seconds, depth=depth))
+
+        return "\n".join(lines) + "\n"
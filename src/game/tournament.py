@@ -0,0 +1,166 @@
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import random
+
+from game.agents import Difficulty, MiniMaxPlayer
+from game.bitboard import WIDTH
+from game.board import ConnectFourBoard
+
+
+def parse_pairing(pairing):
+    """Parses a `FIRST:SECOND` pairing of difficulties, e.g. `HARD:NORMAL`"""
+
+    first, second = pairing.split(":")
+    return Difficulty(first), Difficulty(second)
+
+
+def play_game(difficulty1, difficulty2, opening_plies, seed, time_limit):
+    """Plays a whole AI vs AI game without printing anything
+
+    The first `opening_plies` discs are dropped at random, never into a winning
+    cell, so that games between the same players don't all play out the same.
+
+    Returns:
+        dict -- winner (1, 2, or 0 for a tie), number of moves, seconds spent
+                searching and nodes searched by the AIs
+    """
+
+    player1 = MiniMaxPlayer(no=1, time_limit=time_limit, difficulty=difficulty1)
+    player2 = MiniMaxPlayer(no=2, time_limit=time_limit, difficulty=difficulty2)
+    connect4_board = ConnectFourBoard(player1=player1, player2=player2)
+
+    rng = random.Random(seed)
+    for _ in range(opening_plies):
+        bitboard = connect4_board.bitboard
+        moves = [
+            move
+            for move in range(1, WIDTH + 1)
+            if bitboard.can_play(move - 1) and not bitboard.is_winning_move(move - 1)
+        ]
+        if not moves:
+            break
+        connect4_board.make_move(rng.choice(moves))
+        connect4_board.toggle_players()
+
+    moves = 0
+    nodes = 0
+    seconds = 0.0
+
+    while not connect4_board.is_finished():
+        if connect4_board.is_full():
+            return {"winner": 0, "moves": moves, "seconds": seconds, "nodes": nodes}
+
+        player = connect4_board.current_player
+        start = datetime.datetime.now()
+        move, _ = player.search(connect4_board)
+        seconds += (datetime.datetime.now() - start).total_seconds()
+        moves += 1
+        nodes += player.nodes
+        if player.solver is not None:
+            nodes += player.solver.nodes
+
+        connect4_board.make_move(move)
+        connect4_board.latest_move = move
+        connect4_board.toggle_players()
+
+    # the player to move is the one who lost
+    if connect4_board.current_player is player1:
+        winner = 2
+    else:
+        winner = 1
+
+    return {"winner": winner, "moves": moves, "seconds": seconds, "nodes": nodes}
+
+
+def _play_game(task):
+
+    return play_game(**task)
+
+
+def run_tournament(pairings, games, opening_plies, seed, time_limit, workers=None):
+    """Plays every pairing `games` times with each side moving first
+
+    Games run in parallel on `workers` processes, all cores by default.
+
+    Returns:
+        list -- one dict per pairing with the wins, draws and losses of its first
+                difficulty and the moves and nodes searched per second
+    """
+
+    tasks = []
+    for first, second in pairings:
+        for _ in range(games):
+            # both sides of a game start from the same random opening
+            game_seed = seed + len(tasks) // 2
+            for difficulty1, difficulty2 in ((first, second), (second, first)):
+                tasks.append(
+                    {
+                        "difficulty1": difficulty1,
+                        "difficulty2": difficulty2,
+                        "opening_plies": opening_plies,
+                        "seed": game_seed,
+                        "time_limit": time_limit,
+                    }
+                )
+
+    rows = [
+        {
+            "pairing": "{} vs {}".format(first.value, second.value),
+            "games": 0,
+            "wins": 0,
+            "draws": 0,
+            "losses": 0,
+            "moves": 0,
+            "nodes": 0,
+            "seconds": 0.0,
+        }
+        for first, second in pairings
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_play_game, tasks, chunksize=max(1, games // 4))
+        for number, result in enumerate(results):
+            row = rows[number // (2 * games)]
+            row["games"] += 1
+            row["moves"] += result["moves"]
+            row["nodes"] += result["nodes"]
+            row["seconds"] += result["seconds"]
+
+            if result["winner"] == 0:
+                row["draws"] += 1
+            # even tasks are the ones where the first difficulty moves first
+            elif (result["winner"] == 1) == (number % 2 == 0):
+                row["wins"] += 1
+            else:
+                row["losses"] += 1
+
+    for row in rows:
+        seconds = row.pop("seconds")
+        row["moves/s"] = row["moves"] / seconds if seconds else 0.0
+        row["nodes/s"] = row["nodes"] / seconds if seconds else 0.0
+
+    return rows
+
+
+def format_results(rows):
+    """Lays the rows returned by `run_tournament` out as a table"""
+
+    lines = [
+        "{:<20} {:>6} {:>6} {:>6} {:>6} {:>10} {:>12}".format(
+            "Pairing", "Games", "Wins", "Draws", "Losses", "Moves/s", "Nodes/s"
+        )
+    ]
+    for row in rows:
+        lines.append(
+            "{:<20} {:>6} {:>6} {:>6} {:>6} {:>10.1f} {:>12.0f}".format(
+                row["pairing"],
+                row["games"],
+                row["wins"],
+                row["draws"],
+                row["losses"],
+                row["moves/s"],
+                row["nodes/s"],
+            )
+        )
+
+    return "\n".join(lines)
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from enum import Enum
+
+from game.bitboard import mirror_move
+
+
+class Bound(Enum):
+
+    EXACT = "EXACT"
+    LOWER = "LOWER"
+    UPPER = "UPPER"
+
+
+class TranspositionTable(object):
+    """
+    Remembers searched positions between sibling subtrees and between moves
+
+    Entries are keyed by the position's canonical bitboard key, which a
+    position shares with its mirror image only, and hold a (depth, bound,
+    value, move) tuple. Moves are stored the way round of the canonical
+    position: callers pass whether their position is its mirror image, see
+    `BitBoard.canonical_key`, and get and put their own moves.
+    Once `max_entries` positions are stored, the least recently used one
+    is evicted to make room for the next.
+    """
+
+    def __init__(self, max_entries=250000):
+
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    def get(self, key, mirrored=False):
+
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+
+        if mirrored and entry[3] is not None:
+            return entry[0], entry[1], entry[2], mirror_move(entry[3])
+        return entry
+
+    def peek(self, key, mirrored=False):
+        """Same as `get`, without counting a hit or a miss or refreshing the entry"""
+
+        entry = self.entries.get(key)
+
+        if entry is not None and mirrored and entry[3] is not None:
+            return entry[0], entry[1], entry[2], mirror_move(entry[3])
+        return entry
+
+    def put(self, key, depth, bound, value, move, mirrored=False):
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        elif len(self.entries) >= self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+        if mirrored and move is not None:
+            move = mirror_move(move)
+        self.entries[key] = (depth, bound, value, move)
+
+    def clear(self):
+
+        self.entries.clear()
+        self.reset_counters()
+
+    def reset_counters(self):
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
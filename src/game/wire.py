@@ -0,0 +1,163 @@
+import struct
+
+import numpy as np
+import ujson as json
+
+from game.bitboard import H1, HEIGHT, WIDTH
+
+MAGIC = b"C4"
+VERSION = 2
+
+# value of the "wire" key with which JSON messages offer the binary format
+OFFER = "binary/{}".format(VERSION)
+# value of the "sync" key with which messages offer to leave boards out
+SYNC_OFFER = "delta/1"
+
+# magic, version, flags, number of elements, sequence number (0 if none),
+# session length
+HEADER = struct.Struct("<2sBBBIB")
+ELEMENT = struct.Struct("<B")
+MOVE = struct.Struct("<B")
+CHECKSUM = struct.Struct("<Q")
+BOARD = struct.Struct("<QQ")  # stones of player 1, stones of player 2
+ACK = struct.Struct("<I")
+LOG = struct.Struct("<H")
+
+# element types as in NetworkPlayer.Data
+CODES = {None: 0, "MV": 1, "BR": 2, "RB": 3, "RS": 4, "LG": 5, "FW": 6, "FL": 7}
+TYPES = {code: data_type for data_type, code in CODES.items()}
+HAS_ACK = 0x80
+HAS_CHECKSUM = 0x40
+# header flags
+SYNC_DELTA = 0x01
+
+# bit index of every cell of a grid, top row first, and the bit itself
+CELL_SHIFTS = np.array(
+    [[col * H1 + HEIGHT - 1 - row for col in range(WIDTH)] for row in range(HEIGHT)],
+    dtype=np.uint64,
+)
+CELL_BITS = np.left_shift(np.uint64(1), CELL_SHIFTS)
+# index of every cell's bit in the unpacked bits of a packed BOARD
+BOARD_CELLS = np.array([CELL_SHIFTS, CELL_SHIFTS + 64], dtype=int)
+
+
+def grid_to_bits(grid):
+    """Returns the stones of player 1 and player 2 of a 6*7 grid as bitboards"""
+
+    grid = np.asarray(grid)
+    return int(CELL_BITS[grid == 1].sum()), int(CELL_BITS[grid == 2].sum())
+
+
+def board_to_grid(packed):
+    """Returns the 6*7 grid of a BOARD packed into bytes"""
+
+    bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8), bitorder="little")
+    cells = bits[BOARD_CELLS].astype(int)
+    return cells[0] + 2 * cells[1]
+
+
+def encode(data):
+    """Packs a NetworkPlayer message, a list of elements, into the binary format
+
+    Moves take a byte, and eight more with their checksum, boards the 2x49 bits
+    of both players' stones, and the "seq", "session" and "sync" keys of the
+    elements go into the header once.
+
+    Returns:
+        bytes -- the datagram
+    """
+
+    seq = 0
+    session = b""
+    flags = 0
+    body = []
+
+    for elm in data:
+        seq = elm.get("seq", seq)
+        session = elm.get("session", session)
+        if elm.get("sync") == SYNC_OFFER:
+            flags |= SYNC_DELTA
+        code = CODES[elm["type"]]
+
+        if "ack" in elm:
+            body.append(ELEMENT.pack(code | HAS_ACK) + ACK.pack(elm["ack"]))
+        elif elm["type"] == "MV" and elm.get("checksum") is not None:
+            body.append(ELEMENT.pack(code | HAS_CHECKSUM))
+            body.append(MOVE.pack(elm["content"] or 0))
+            body.append(CHECKSUM.pack(elm["checksum"]))
+        elif elm["type"] == "MV":
+            body.append(ELEMENT.pack(code))
+            body.append(MOVE.pack(elm["content"] or 0))
+        elif elm["type"] == "BR":
+            body.append(ELEMENT.pack(code))
+            body.append(BOARD.pack(*grid_to_bits(elm["content"])))
+        elif elm["type"] == "LG":
+            log = elm["content"].encode()
+            body.append(ELEMENT.pack(code))
+            body.append(LOG.pack(len(log)) + log)
+        else:
+            body.append(ELEMENT.pack(code))
+
+    if isinstance(session, str):
+        session = session.encode()
+
+    return (
+        HEADER.pack(MAGIC, VERSION, flags, len(data), seq, len(session))
+        + session
+        + b"".join(body)
+    )
+
+
+def decode(data):
+    """Unpacks a datagram in either the binary or the JSON format
+
+    Returns:
+        tuple -- (list of elements as in the JSON format, whether it was binary),
+                 boards are numpy arrays rather than lists
+    """
+
+    if not data.startswith(MAGIC):
+        return json.loads(data.decode()), False
+
+    magic, version, flags, count, seq, session_length = HEADER.unpack_from(data, 0)
+    if version != VERSION:
+        raise ValueError("Unknown wire format version {}.".format(version))
+
+    offset = HEADER.size
+    session = data[offset : offset + session_length].decode()
+    offset += session_length
+
+    elements = []
+    for _ in range(count):
+        (code,) = ELEMENT.unpack_from(data, offset)
+        offset += ELEMENT.size
+        elm = {"type": TYPES[code & ~(HAS_ACK | HAS_CHECKSUM)], "content": None}
+
+        if code & HAS_ACK:
+            (elm["ack"],) = ACK.unpack_from(data, offset)
+            offset += ACK.size
+        elif elm["type"] == "MV":
+            (move,) = MOVE.unpack_from(data, offset)
+            offset += MOVE.size
+            elm["content"] = move or None
+            if code & HAS_CHECKSUM:
+                (elm["checksum"],) = CHECKSUM.unpack_from(data, offset)
+                offset += CHECKSUM.size
+        elif elm["type"] == "BR":
+            elm["content"] = board_to_grid(data[offset : offset + BOARD.size])
+            offset += BOARD.size
+        elif elm["type"] == "LG":
+            (length,) = LOG.unpack_from(data, offset)
+            offset += LOG.size
+            elm["content"] = data[offset : offset + length].decode()
+            offset += length
+
+        if seq:
+            elm["seq"] = seq
+        if session:
+            elm["session"] = session
+        if flags & SYNC_DELTA:
+            elm["sync"] = SYNC_OFFER
+        elements.append(elm)
+
+    return elements, True
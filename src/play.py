@@ -1,181 +1,423 @@
-__doc__ = """
-Play connect four in the comfort of your terminal.
-
-Player types are HUMANPLAYER, NETWORKPLAYER, and MINIMAXPLAYER.
-Player difficulties are HARD, NORMAL, and EASY.
-Ports and address are only used in network games.
-Player difficulties are only used in case of using an AI.
-When playing as a HUMANPLAYER, you can input `save <savefile>` to save the game and exit your client or `exit` to exit your client.
-
-Usage:
-  play.py [--debugging] [--verbose] load <savefile>
-  play.py [--time-limit=TIMEINSECONDS]
-          [--local-port=PORT] [--peer-address=ADDRESS] [--peer-port=PORT]
-          [--debugging] [--verbose]
-          [--p1-difficulty=DIFFICULTY] [--p2-difficulty=DIFFICULTY]
-          <playertype> vs <playertype>
-  play.py (-h | --help)
-
-Options:
-  -h --help                   Show this screen.
-  --time-limit=TIMEINSECONDS  Maximum allowed time per player move in seconds [default: 180].
-  --local-port=PORT           Local port [default: 3500].
-  --peer-address=ADDRESS      Peer player's IP address.
-  --peer-port=PORT            Peer player's port [default: 3500].
-  --p1-difficulty=DIFFICULTY  First player difficulty [default: NORMAL].
-  --p2-difficulty=DIFFICULTY  Second player difficulty [default: NORMAL].
-  -d --debugging              Save debugging log.
-  -v --verbose                Turn on verbose output mode.
-"""
-
-
-from sys import exit, stdout
-import pickle
-import platform
-
-from colorama import Fore, init
-from docopt import docopt
-from loguru import logger
-from tinydb import Query, TinyDB
-from tinydb.middlewares import CachingMiddleware
-from tinydb.storages import JSONStorage
-import numpy as np
-
-from game.agents import Agents, Difficulty, RandomPlayer, agents
-from game.board import ConnectFourBoard
-
-
-if __name__ == "__main__":
-
-    if platform.system() == 'Windows':
-        init(convert=True)
-
-    args = docopt(__doc__)
-
-    logger.remove(0)
-
-    if args["--verbose"]:
-        logger.add(stdout, filter=lambda record: "verbose" in record["extra"])
-
-    if args["--debugging"]:
-        logger.add(
-            "debug{time}.log", filter=lambda record: "verbose" not in record["extra"]
-        )
-
-    try:
-        time_limit = int(args["--time-limit"])
-    except:
-        logger.error("Time limit must be an int value.")
-        exit(Fore.RED + "Time limit must be an int value." + Fore.RESET)
-
-    try:
-        local_port = int(args["--local-port"])
-    except:
-        logger.error("Local port must be an int value.")
-        exit(Fore.RED + "Local port must be an int value." + Fore.RESET)
-
-    try:
-        peer_port = int(args["--peer-port"])
-    except:
-        logger.error("Peer port must be an int value.")
-        exit(Fore.RED + "Peer port must be an int value." + Fore.RESET)
-
-    if args["load"]:
-
-        db = TinyDB(args["<savefile>"], storage=CachingMiddleware(JSONStorage))
-        q = Query()
-        data = db.get(q.fname == args["<savefile>"])
-
-        with open(data["player1"], "rb") as p1:
-            player1 = pickle.load(p1)
-        with open(data["player2"], "rb") as p2:
-            player2 = pickle.load(p2)
-
-        if data["current_player"] == 1:
-            current_player = player1
-        else:
-            current_player = player2
-        initial_state = np.array(data["board"], dtype=int)
-
-        db.close()
-
-        ConnectFourBoard(
-            player1=player1,
-            player2=player2,
-            current_player=current_player,
-            initial_state=initial_state,
-        ).start_game_loop()
-
-    elif args["vs"]:
-
-        try:
-
-            player1, player2 = (
-                Agents(args["<playertype>"][0]),
-                Agents(args["<playertype>"][1]),
-            )
-
-            try:
-                if player1 not in [Agents.HumanPlayer, Agents.NetworkPlayer]:
-                    diff1 = Difficulty(args["--p1-difficulty"])
-                    diff2 = Difficulty(args["--p2-difficulty"])
-                elif player2 not in [Agents.HumanPlayer, Agents.NetworkPlayer]:
-                    diff1 = Difficulty(args["--p1-difficulty"])
-                    diff2 = Difficulty(args["--p2-difficulty"])
-            except:
-                logger.error("You must enter a correct difficulty.")
-                raise ValueError
-
-            if player1 is Agents.NetworkPlayer and player2 is Agents.NetworkPlayer:
-                logger.error("You must have at lease one local player.")
-                raise ValueError
-            elif player1 is Agents.NetworkPlayer or player2 is Agents.NetworkPlayer:
-                if args["--peer-address"] is None:
-                    logger.error(
-                        "You must enter the peer player's IP address to play a network game."
-                    )
-                    raise ValueError
-
-                if player1 is Agents.NetworkPlayer:
-                    player1 = agents[player1](
-                        local_port=local_port,
-                        peer_address=args["--peer-address"],
-                        peer_port=peer_port,
-                        no=1,
-                        time_limit=time_limit,
-                    )
-                    player2 = agents[player2](no=2, time_limit=time_limit)
-                elif player2 is Agents.NetworkPlayer:
-                    player1 = agents[player1](no=1, time_limit=time_limit)
-                    player2 = agents[player2](
-                        local_port=local_port,
-                        peer_address=args["--peer-address"],
-                        peer_port=peer_port,
-                        no=2,
-                        time_limit=time_limit,
-                    )
-            elif player1 not in [
-                Agents.HumanPlayer,
-                Agents.NetworkPlayer,
-            ] and player2 not in [Agents.HumanPlayer, Agents.NetworkPlayer]:
-                player1 = agents[player1](no=1, time_limit=time_limit, difficulty=diff1)
-                player2 = agents[player2](no=2, time_limit=time_limit, difficulty=diff2)
-            elif player1 not in [Agents.HumanPlayer, Agents.NetworkPlayer]:
-                player1 = agents[player1](no=1, time_limit=time_limit, difficulty=diff1)
-                player2 = agents[player2](no=2, time_limit=time_limit)
-            elif player2 not in [Agents.HumanPlayer, Agents.NetworkPlayer]:
-                player1 = agents[player1](no=1, time_limit=time_limit)
-                player2 = agents[player2](no=2, time_limit=time_limit, difficulty=diff2)
-            else:
-                player1 = agents[player1](no=1, time_limit=time_limit)
-                player2 = agents[player2](no=2, time_limit=time_limit)
-
-        except:
-            print(
-                Fore.RED
-                + "You must have at lease one local player.\nYou must enter a correct difficulty.\nYou must enter the peer player's IP address to play a network game."
-                + Fore.RESET
-            )
-            exit(__doc__)
-
-        ConnectFourBoard(player1=player1, player2=player2).start_game_loop()
+__doc__ = """
+Play connect four in the comfort of your terminal.
+
+Player types are HUMANPLAYER, NETWORKPLAYER, MINIMAXPLAYER, and MCTSPLAYER.
+Player difficulties are PERFECT, HARD, NORMAL, and EASY.
+Ports and address are only used in network games.
+Player difficulties are only used in case of using an AI.
+Tournament pairings are two difficulties, e.g. `HARD:NORMAL`, played headless by AIs.
+A game server hosts matches of NETWORKPLAYER clients against AIs, many at a time on one port.
+An endgame database solves the positions the saved games went through once few cells were left empty.
+When playing as a HUMANPLAYER, you can input `save <savefile>` to save the game and exit your client or `exit` to exit your client.
+
+Usage:
+  play.py [--debugging] [--verbose] load <savefile>
+  play.py [--time-limit=TIMEINSECONDS] [--debugging] [--verbose]
+          [--book-plies=PLIES] [--book-level=DIFFICULTY]
+          book <bookfile>
+  play.py [--debugging] [--verbose] [--empty-cells=CELLS]
+          endgame <endgamefile> <savefile>...
+  play.py [--time-limit=TIMEINSECONDS] [--debugging] [--verbose]
+          [--games=N] [--opening-plies=PLIES] [--seed=SEED] [--workers=N]
+          tournament <pairing>...
+  play.py [--time-limit=TIMEINSECONDS] [--debugging] [--verbose]
+          [--local-port=PORT] [--workers=N] [--tt-size=ENTRIES] [--solver-size=ENTRIES]
+          [--book=BOOKFILE] [--server-difficulty=DIFFICULTY] [--endgame=ENDGAMEFILE]
+          serve
+  play.py [--time-limit=TIMEINSECONDS]
+          [--local-port=PORT] [--peer-address=ADDRESS] [--peer-port=PORT]
+          [--debugging] [--verbose] [--tt-size=ENTRIES] [--solver-size=ENTRIES]
+          [--book=BOOKFILE] [--threads=N] [--stats=FILE] [--stats-format=FORMAT]
+          [--ordering=HEURISTICS] [--ponder] [--session=ID] [--wire=FORMAT]
+          [--sync=MODE] [--endgame=ENDGAMEFILE] [--search=MODE]
+          [--iterations=N]
+          [--p1-difficulty=DIFFICULTY] [--p2-difficulty=DIFFICULTY]
+          <playertype> vs <playertype>
+  play.py (-h | --help)
+
+Options:
+  -h --help                   Show this screen.
+  --time-limit=TIMEINSECONDS  Maximum allowed time per player move in seconds [default: 180].
+  --local-port=PORT           Local port [default: 3500].
+  --peer-address=ADDRESS      Peer player's IP address.
+  --peer-port=PORT            Peer player's port [default: 3500].
+  --p1-difficulty=DIFFICULTY  First player difficulty [default: NORMAL].
+  --p2-difficulty=DIFFICULTY  Second player difficulty [default: NORMAL].
+  --tt-size=ENTRIES           Maximum number of positions an AI remembers [default: 250000].
+  --solver-size=ENTRIES       Maximum number of positions the solver of a PERFECT AI remembers [default: 250000].
+  --book=BOOKFILE             Opening book the AI players look their moves up in first.
+  --endgame=ENDGAMEFILE       Endgame database the AI players look positions near the end of the game up in.
+  --threads=N                 Number of processes every AI player searches with [default: 1].
+  --stats=FILE                Record the search statistics of every AI move into FILE.
+  --stats-format=FORMAT       Format of the statistics, json or prometheus [default: json].
+  --ordering=HEURISTICS       Move ordering heuristics of the AIs out of threats, killers, and history [default: threats,killers].
+  --ponder                    Let the AIs keep searching while their opponent thinks.
+  --iterations=N              Playouts of every MCTSPLAYER move, by difficulty if omitted, the time limit permitting.
+  --search=MODE               Search of the AIs, pvs for principal variation search with aspiration windows, or alphabeta [default: alphabeta].
+  --book-plies=PLIES          Number of discs up to which a generated book covers positions [default: 4].
+  --book-level=DIFFICULTY     Difficulty used to search the positions of a generated book [default: HARD].
+  --empty-cells=CELLS         Most empty cells of the positions a generated endgame database covers [default: 12].
+  --games=N                   Tournament games per pairing and side [default: 10].
+  --opening-plies=PLIES       Random discs dropped before the AIs of a tournament game take over [default: 2].
+  --seed=SEED                 Seed of the random tournament openings [default: 0].
+  --workers=N                 Processes playing tournament games or server AIs, all cores if omitted.
+  --server-difficulty=DIFFICULTY  Difficulty of the AIs a game server plays with [default: HARD].
+  --session=ID                Match to play when the peer is a game server hosting many.
+  --wire=FORMAT               Network format, binary once the peer offers it too, or json [default: binary].
+  --sync=MODE                 Network sync, delta sends checksums for boards once the peer offers it too, or board [default: delta].
+  -d --debugging              Save debugging log.
+  -v --verbose                Turn on verbose output mode, search statistics of every AI move included.
+"""
+
+
+from sys import exit, stdout
+import platform
+
+from colorama import Fore, init
+from docopt import docopt
+from loguru import logger
+from game.agents import (
+    Agents,
+    Difficulty,
+    MiniMaxPlayer,
+    RandomPlayer,
+    SearchMode,
+    agents,
+    player_from_config,
+)
+from game.board import ConnectFourBoard
+from game.bitboard import HEIGHT, WIDTH
+from game.book import OpeningBook, generate_book
+from game.endgame import EndgameDatabase, generate_endgame
+from game.ordering import parse_ordering
+from game.savefile import load_game, load_positions, read_game
+from game.server import GameServer
+from game.tournament import format_results, parse_pairing, run_tournament
+
+
+if __name__ == "__main__":
+
+    if platform.system() == 'Windows':
+        init(convert=True)
+
+    args = docopt(__doc__)
+
+    logger.remove(0)
+
+    if args["--verbose"]:
+        logger.add(stdout, filter=lambda record: "verbose" in record["extra"])
+
+    if args["--debugging"]:
+        logger.add(
+            "debug{time}.log", filter=lambda record: "verbose" not in record["extra"]
+        )
+
+    try:
+        time_limit = int(args["--time-limit"])
+    except:
+        logger.error("Time limit must be an int value.")
+        exit(Fore.RED + "Time limit must be an int value." + Fore.RESET)
+
+    try:
+        local_port = int(args["--local-port"])
+    except:
+        logger.error("Local port must be an int value.")
+        exit(Fore.RED + "Local port must be an int value." + Fore.RESET)
+
+    try:
+        peer_port = int(args["--peer-port"])
+    except:
+        logger.error("Peer port must be an int value.")
+        exit(Fore.RED + "Peer port must be an int value." + Fore.RESET)
+
+    try:
+        tt_size = int(args["--tt-size"])
+    except:
+        logger.error("Transposition table size must be an int value.")
+        exit(Fore.RED + "Transposition table size must be an int value." + Fore.RESET)
+
+    try:
+        solver_size = int(args["--solver-size"])
+    except:
+        logger.error("Solver table size must be an int value.")
+        exit(Fore.RED + "Solver table size must be an int value." + Fore.RESET)
+
+    try:
+        threads = int(args["--threads"])
+    except:
+        logger.error("Threads must be an int value.")
+        exit(Fore.RED + "Threads must be an int value." + Fore.RESET)
+
+    if args["--wire"] not in ("binary", "json"):
+        logger.error("Network format must be binary or json.")
+        exit(Fore.RED + "Network format must be binary or json." + Fore.RESET)
+
+    if args["--sync"] not in ("delta", "board"):
+        logger.error("Network sync must be delta or board.")
+        exit(Fore.RED + "Network sync must be delta or board." + Fore.RESET)
+
+    try:
+        parse_ordering(args["--ordering"])
+    except:
+        logger.error("Move ordering heuristics must be threats, killers, or history.")
+        exit(
+            Fore.RED
+            + "Move ordering heuristics must be threats, killers, or history."
+            + Fore.RESET
+        )
+
+    try:
+        iterations = None if args["--iterations"] is None else int(args["--iterations"])
+    except:
+        logger.error("Iterations must be an int value.")
+        exit(Fore.RED + "Iterations must be an int value." + Fore.RESET)
+
+    if args["--search"] not in ("alphabeta", "pvs"):
+        logger.error("Search must be alphabeta or pvs.")
+        exit(Fore.RED + "Search must be alphabeta or pvs." + Fore.RESET)
+
+    if args["--stats-format"] not in ("json", "prometheus"):
+        logger.error("Statistics format must be json or prometheus.")
+        exit(Fore.RED + "Statistics format must be json or prometheus." + Fore.RESET)
+
+    if args["tournament"]:
+
+        try:
+            pairings = [parse_pairing(pairing) for pairing in args["<pairing>"]]
+            games = int(args["--games"])
+            opening_plies = int(args["--opening-plies"])
+            seed = int(args["--seed"])
+            workers = None if args["--workers"] is None else int(args["--workers"])
+        except:
+            logger.error(
+                "Pairings must look like HARD:NORMAL and counts be int values."
+            )
+            exit(__doc__)
+
+        rows = run_tournament(
+            pairings=pairings,
+            games=games,
+            opening_plies=opening_plies,
+            seed=seed,
+            time_limit=time_limit,
+            workers=workers,
+        )
+        print(format_results(rows))
+
+    elif args["serve"]:
+
+        try:
+            server_difficulty = Difficulty(args["--server-difficulty"])
+            workers = None if args["--workers"] is None else int(args["--workers"])
+        except:
+            logger.error(
+                "Server difficulty must be a difficulty and workers an int value."
+            )
+            exit(__doc__)
+
+        server = GameServer(
+            listener=":{}".format(local_port),
+            settings={
+                "time_limit": time_limit,
+                "difficulty": server_difficulty,
+                "tt_size": tt_size,
+                "solver_size": solver_size,
+                "book": args["--book"],
+                "endgame": args["--endgame"],
+            },
+            workers=workers,
+        )
+        print(
+            Fore.GREEN
+            + "Serving games against {} AIs on port {}.".format(
+                server_difficulty.value, local_port
+            )
+            + Fore.RESET
+        )
+        server.serve_forever()
+
+    elif args["book"]:
+
+        try:
+            book_plies = int(args["--book-plies"])
+            book_level = Difficulty(args["--book-level"])
+        except:
+            logger.error("Book plies must be an int value and book level a difficulty.")
+            exit(__doc__)
+
+        size = generate_book(
+            path=args["<bookfile>"],
+            plies=book_plies,
+            player1=MiniMaxPlayer(no=1, time_limit=time_limit, difficulty=book_level),
+            player2=MiniMaxPlayer(no=2, time_limit=time_limit, difficulty=book_level),
+        )
+        print(
+            Fore.GREEN
+            + "Wrote {} positions to {}.".format(size, args["<bookfile>"])
+            + Fore.RESET
+        )
+
+    elif args["endgame"]:
+
+        try:
+            empty_cells = int(args["--empty-cells"])
+        except:
+            logger.error("Empty cells must be an int value.")
+            exit(__doc__)
+
+        try:
+            seeds = [
+                bitboard
+                for _, bitboard in load_positions(
+                    args["<savefile>"], max_moves=WIDTH * HEIGHT - empty_cells
+                )
+                if WIDTH * HEIGHT - bitboard.moves <= empty_cells
+            ]
+        except:
+            logger.error("Cannot read the save files {}.".format(args["<savefile>"]))
+            exit(Fore.RED + "Cannot read the save files." + Fore.RESET)
+
+        size = generate_endgame(
+            path=args["<endgamefile>"], seeds=seeds, max_empty=empty_cells
+        )
+        print(
+            Fore.GREEN
+            + "Wrote {} positions from {} games to {}.".format(
+                size, len(seeds), args["<endgamefile>"]
+            )
+            + Fore.RESET
+        )
+
+    elif args["load"]:
+
+        try:
+            save = read_game(args["<savefile>"])
+        except:
+            logger.error("Cannot read the save file {}.".format(args["<savefile>"]))
+            exit(Fore.RED + "Cannot read the save file." + Fore.RESET)
+
+        player1, player2 = [player_from_config(config) for config in save["players"]]
+
+        load_game(save, player1, player2).start_game_loop()
+
+    elif args["vs"]:
+
+        book = None
+        if args["--book"] is not None:
+            try:
+                book = OpeningBook(args["--book"])
+            except:
+                logger.error("Cannot open the opening book {}.".format(args["--book"]))
+                exit(Fore.RED + "Cannot open the opening book." + Fore.RESET)
+
+        endgame = None
+        if args["--endgame"] is not None:
+            try:
+                endgame = EndgameDatabase(args["--endgame"])
+            except:
+                logger.error(
+                    "Cannot open the endgame database {}.".format(args["--endgame"])
+                )
+                exit(Fore.RED + "Cannot open the endgame database." + Fore.RESET)
+
+        # settings of every AI but its number and difficulty
+        ai_settings = {
+            Agents.MiniMaxPlayer: {
+                "tt_size": tt_size,
+                "solver_size": solver_size,
+                "book": book,
+                "endgame": endgame,
+                "threads": threads,
+                "stats": args["--verbose"],
+                "stats_file": args["--stats"],
+                "stats_format": args["--stats-format"],
+                "ordering": parse_ordering(args["--ordering"]),
+                "ponder": args["--ponder"],
+                "search_mode": SearchMode(args["--search"]),
+            },
+            Agents.MCTSPlayer: {
+                "book": book,
+                "threads": threads,
+                "iterations": iterations,
+            },
+        }
+
+        def local_player(agent, no, difficulty):
+            """Builds a player of this terminal, with the AI settings if it is an AI"""
+
+            if agent in ai_settings:
+                return agents[agent](
+                    no=no,
+                    time_limit=time_limit,
+                    difficulty=difficulty,
+                    **ai_settings[agent]
+                )
+            return agents[agent](no=no, time_limit=time_limit)
+
+        try:
+
+            player1, player2 = (
+                Agents(args["<playertype>"][0]),
+                Agents(args["<playertype>"][1]),
+            )
+
+            diff1 = diff2 = None  # only AIs have one
+
+            try:
+                if player1 not in [Agents.HumanPlayer, Agents.NetworkPlayer]:
+                    diff1 = Difficulty(args["--p1-difficulty"])
+                    diff2 = Difficulty(args["--p2-difficulty"])
+                elif player2 not in [Agents.HumanPlayer, Agents.NetworkPlayer]:
+                    diff1 = Difficulty(args["--p1-difficulty"])
+                    diff2 = Difficulty(args["--p2-difficulty"])
+            except:
+                logger.error("You must enter a correct difficulty.")
+                raise ValueError
+
+            if player1 is Agents.NetworkPlayer and player2 is Agents.NetworkPlayer:
+                logger.error("You must have at lease one local player.")
+                raise ValueError
+            elif player1 is Agents.NetworkPlayer or player2 is Agents.NetworkPlayer:
+                if args["--peer-address"] is None:
+                    logger.error(
+                        "You must enter the peer player's IP address to play a network game."
+                    )
+                    raise ValueError
+
+                if player1 is Agents.NetworkPlayer:
+                    player1 = agents[player1](
+                        local_port=local_port,
+                        peer_address=args["--peer-address"],
+                        peer_port=peer_port,
+                        session=args["--session"],
+                        wire=args["--wire"],
+                        sync=args["--sync"],
+                        no=1,
+                        time_limit=time_limit,
+                    )
+                    player2 = local_player(player2, 2, diff2)
+                elif player2 is Agents.NetworkPlayer:
+                    player1 = local_player(player1, 1, diff1)
+                    player2 = agents[player2](
+                        local_port=local_port,
+                        peer_address=args["--peer-address"],
+                        peer_port=peer_port,
+                        session=args["--session"],
+                        wire=args["--wire"],
+                        sync=args["--sync"],
+                        no=2,
+                        time_limit=time_limit,
+                    )
+            else:
+                player1 = local_player(player1, 1, diff1)
+                player2 = local_player(player2, 2, diff2)
+
+        except:
+            print(
+                Fore.RED
+                + "You must have at lease one local player.\nYou must enter a correct difficulty.\nYou must enter the peer player's IP address to play a network game."
+                + Fore.RESET
+            )
+            exit(__doc__)
+
+        ConnectFourBoard(player1=player1, player2=player2).start_game_loop()
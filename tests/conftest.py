@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the game package lives in src/, next to play.py, which is run from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
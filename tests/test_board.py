@@ -0,0 +1,115 @@
+import random
+
+import numpy as np
+
+from game.agents import Player
+from game.bitboard import BitBoard, mirror
+from game.board import ConnectFourBoard
+from game.evaluation import streak_counts
+
+
+def state(bitboard):
+
+    return (
+        bitboard.position,
+        bitboard.mask,
+        bitboard.moves,
+        list(bitboard.heights),
+        bitboard.mirrored_position,
+        bitboard.mirrored_mask,
+    )
+
+
+def random_moves(seed, count):
+    """Columns, counted from 0, of a random game that may end on a full column"""
+
+    rng = random.Random(seed)
+    bitboard = BitBoard()
+    moves = []
+    for _ in range(count):
+        col = rng.choice([col for col in range(7) if bitboard.can_play(col)])
+        bitboard.play(col)
+        moves.append(col)
+    return moves
+
+
+def test_play_and_undo_restore_the_bitboard():
+
+    for seed in range(20):
+        bitboard = BitBoard()
+        states = [state(bitboard)]
+        moves = random_moves(seed, 30)
+
+        for col in moves:
+            bitboard.play(col)
+            states.append(state(bitboard))
+
+        for col in reversed(moves):
+            assert state(bitboard) == states.pop()
+            bitboard.undo(col)
+        assert state(bitboard) == states.pop() == state(BitBoard())
+
+
+def test_mirrored_fields_follow_the_moves():
+
+    bitboard = BitBoard()
+    for col in random_moves(1, 25):
+        bitboard.play(col)
+        assert bitboard.mirrored_position == mirror(bitboard.position)
+        assert bitboard.mirrored_mask == mirror(bitboard.mask)
+
+
+def test_from_grid_round_trip():
+
+    bitboard = BitBoard()
+    for col in random_moves(2, 17):
+        bitboard.play(col)
+
+    assert state(BitBoard.from_grid(bitboard.to_grid())) == state(bitboard)
+
+
+def test_mirror_images_share_their_canonical_key():
+
+    bitboard, mirrored = BitBoard(), BitBoard()
+    for col in random_moves(3, 12):
+        bitboard.play(col)
+        mirrored.play(6 - col)
+
+    assert bitboard.canonical_key()[0] == mirrored.canonical_key()[0]
+    assert bitboard.canonical_key()[1] != mirrored.canonical_key()[1]
+
+
+def test_make_and_undo_move_restore_the_board_and_its_streaks():
+
+    connect4_board = ConnectFourBoard(Player(no=1), Player(no=2))
+    connect4_board.track_streaks()
+    moves = [col + 1 for col in random_moves(4, 20)]
+
+    grids = []
+    for move in moves:
+        grids.append(connect4_board.current_grid_state)
+        connect4_board.make_move(move)
+        for player_no in (1, 2):
+            assert connect4_board.streaks.counts[player_no] == list(
+                streak_counts(connect4_board.bitboard.stones(player_no))
+            )
+
+    for move in reversed(moves):
+        assert connect4_board.undo_move() == move
+        assert np.array_equal(connect4_board.current_grid_state, grids.pop())
+    assert connect4_board.move_stack == []
+    assert connect4_board.streaks.counts[1] == [0, 0, 0]
+
+
+def test_copy_is_independent():
+
+    connect4_board = ConnectFourBoard(Player(no=1), Player(no=2))
+    for move in (4, 4, 3):
+        connect4_board.make_move(move)
+
+    copied = connect4_board.copy()
+    copied.make_move(5)
+
+    assert state(connect4_board.bitboard) != state(copied.bitboard)
+    assert len(connect4_board.move_stack) == 3
+    assert copied.current_player is connect4_board.current_player
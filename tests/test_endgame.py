@@ -0,0 +1,70 @@
+import pytest
+
+from game.bitboard import WIDTH, BitBoard
+from game.endgame import EndgameDatabase, generate_endgame
+from game.solver import CELLS, Solver
+
+SEED = "53662473553342551654737267624434"
+
+
+def play(moves):
+
+    bitboard = BitBoard()
+    for move in moves:
+        bitboard.play(int(move) - 1)
+    return bitboard
+
+
+def positions(bitboard, max_empty):
+    """Every position not won yet reachable from `bitboard`, as copies"""
+
+    if CELLS - bitboard.moves <= max_empty:
+        yield bitboard.copy()
+    for col in range(WIDTH):
+        if bitboard.can_play(col) and not bitboard.is_winning_move(col):
+            bitboard.play(col)
+            for position in positions(bitboard, max_empty):
+                yield position
+            bitboard.undo(col)
+
+
+def test_probes_match_the_solver(tmp_path):
+
+    path = str(tmp_path / "endgame.bin")
+    seed = play(SEED)
+    size = generate_endgame(path, [seed], max_empty=8)
+    endgame = EndgameDatabase(path)
+    solver = Solver()
+
+    assert len(endgame) == size > 0
+    assert endgame.min_moves == CELLS - 8
+    assert seed.key() == play(SEED).key()
+
+    for bitboard in positions(seed, 8):
+        if bitboard.moves == CELLS:
+            continue
+        move, score = endgame.probe(*bitboard.canonical_key())
+        assert score == solver.solve(bitboard.position, bitboard.mask, bitboard.moves)
+        assert bitboard.can_play(move - 1)
+
+    endgame.close()
+
+
+def test_positions_left_out_are_not_found(tmp_path):
+
+    path = str(tmp_path / "endgame.bin")
+    generate_endgame(path, [play(SEED)], max_empty=6)
+    endgame = EndgameDatabase(path)
+
+    assert endgame.probe(*play(SEED).canonical_key()) is None
+
+    endgame.close()
+
+
+def test_other_files_are_refused(tmp_path):
+
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\0" * 64)
+
+    with pytest.raises(ValueError):
+        EndgameDatabase(str(path))
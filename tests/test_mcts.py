@@ -0,0 +1,73 @@
+import numpy as np
+
+from game.bitboard import BitBoard
+from game.mcts import DRAW, WIN, MonteCarloTreeSearch, batch_playouts
+
+
+def play(moves):
+
+    bitboard = BitBoard()
+    for move in moves:
+        bitboard.play(move - 1)
+    return bitboard
+
+
+def best_move(tree):
+
+    stats = tree.root_stats()
+    return max(stats, key=lambda move: stats[move][0])
+
+
+def test_finds_a_win_in_one():
+
+    bitboard = play([1, 1, 2, 2, 3, 3])
+    tree = MonteCarloTreeSearch(seed=0)
+    tree.set_position(bitboard.position, bitboard.mask)
+    tree.search(iterations=2000)
+
+    assert best_move(tree) == 4
+
+
+def test_blocks_a_loss_in_one():
+
+    bitboard = play([1, 1, 2, 2, 3, 7])
+    tree = MonteCarloTreeSearch(seed=0)
+    tree.set_position(bitboard.position, bitboard.mask)
+    tree.search(iterations=4000)
+
+    assert best_move(tree) == 4
+
+
+def test_searches_no_more_than_the_iterations():
+
+    for iterations in (1, 10, 64, 100):
+        tree = MonteCarloTreeSearch(batch_size=64, seed=0)
+        tree.set_position(0, 0)
+        tree.search(iterations=iterations)
+        assert tree.playouts == iterations
+        assert tree.root.visits == iterations
+
+
+def test_the_subtree_of_the_position_reached_is_reused():
+
+    tree = MonteCarloTreeSearch(seed=0)
+    tree.set_position(0, 0)
+    tree.search(iterations=500)
+
+    bitboard = play([4, 3])
+    assert tree.set_position(bitboard.position, bitboard.mask)
+    assert tree.root.visits > 0
+    elsewhere = play([1, 1, 1])
+    assert not tree.set_position(elsewhere.position, elsewhere.mask)
+    assert tree.root.visits == 0
+
+
+def test_playouts_end_in_a_result():
+
+    bitboard = play([4, 4, 3])
+    results = batch_playouts(
+        [bitboard.position] * 100, [bitboard.mask] * 100, np.random.default_rng(0)
+    )
+
+    assert set(results) <= {WIN, DRAW, 0.0}
+    assert 0.0 < results.mean() < WIN
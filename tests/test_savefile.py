@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from game.agents import Player
+from game.board import ConnectFourBoard
+from game.savefile import load_game, load_positions, read_game, save_game
+
+
+def test_save_and_load_round_trip(tmp_path):
+
+    player1, player2 = Player(no=1), Player(no=2)
+    start = np.zeros((6, 7), dtype=int)
+    start[5, 0] = 1
+    start[5, 6] = 2
+    connect4_board = ConnectFourBoard(player1, player2, initial_state=start)
+    for move in (4, 4, 3, 5):
+        connect4_board.make_move(move)
+    connect4_board.current_player = player1
+
+    path = str(tmp_path / "game.json")
+    save_game(path, connect4_board)
+    save = read_game(path)
+    loaded = load_game(save, player1, player2)
+
+    assert save["moves"] == [4, 4, 3, 5]
+    assert np.array_equal(save["start"], start)
+    assert save["players"] == [player1.config(), player2.config()]
+    assert np.array_equal(loaded.current_grid_state, connect4_board.current_grid_state)
+    assert loaded.move_stack == connect4_board.move_stack
+    assert loaded.current_player is player1
+
+
+def test_load_positions_replays_the_moves(tmp_path):
+
+    connect4_board = ConnectFourBoard(Player(no=1), Player(no=2))
+    for move in (1, 2, 3, 4, 5):
+        connect4_board.make_move(move)
+    path = str(tmp_path / "game.json")
+    save_game(path, connect4_board)
+
+    [(_, bitboard)] = load_positions([path])
+    [(_, early)] = load_positions([path], max_moves=2)
+
+    assert bitboard.key() == connect4_board.bitboard.key()
+    assert early.moves == 2
+
+
+def test_other_files_are_refused(tmp_path):
+
+    path = tmp_path / "other.json"
+    path.write_text('{"format": "something else"}')
+
+    with pytest.raises(ValueError):
+        read_game(str(path))
@@ -0,0 +1,76 @@
+from game.bitboard import WIDTH, BitBoard
+from game.solver import CELLS, Solver
+
+# move sequences, columns counted from 1, ten cells or fewer from a full board
+ENDGAMES = [
+    "53662473553342551654737267624434",
+    "3163244677214773126252461431354667",
+    "115751141271355234245335373667" + "47",
+    "6247167412115343611737536542" + "2223",
+]
+
+
+def play(moves):
+
+    bitboard = BitBoard()
+    for move in moves:
+        bitboard.play(int(move) - 1)
+    return bitboard
+
+
+def negamax(bitboard):
+    """Exact score on the Solver's scale, searching every continuation"""
+
+    if bitboard.moves == CELLS:
+        return 0
+
+    scores = []
+    for col in range(WIDTH):
+        if not bitboard.can_play(col):
+            continue
+        if bitboard.is_winning_move(col):
+            return (CELLS + 1 - bitboard.moves) // 2
+        bitboard.play(col)
+        scores.append(-negamax(bitboard))
+        bitboard.undo(col)
+
+    return max(scores)
+
+
+def test_solver_matches_a_full_negamax():
+
+    solver = Solver()
+
+    for moves in ENDGAMES:
+        bitboard = play(moves)
+        # and every position one move further
+        for col in range(WIDTH):
+            if bitboard.can_play(col) and not bitboard.is_winning_move(col):
+                bitboard.play(col)
+                assert solver.solve(
+                    bitboard.position, bitboard.mask, bitboard.moves
+                ) == negamax(bitboard)
+                bitboard.undo(col)
+
+        assert solver.solve(bitboard.position, bitboard.mask, bitboard.moves) == (
+            negamax(bitboard)
+        )
+
+
+def test_best_move_scores_like_the_negamax():
+
+    for moves in ENDGAMES:
+        bitboard = play(moves)
+        move, score = Solver().best_move(bitboard)
+
+        assert score == negamax(bitboard)
+        assert bitboard.can_play(move - 1)
+
+
+def test_a_small_table_gives_the_same_scores():
+
+    for moves in ENDGAMES:
+        bitboard = play(moves)
+        assert Solver(max_entries=8).solve(
+            bitboard.position, bitboard.mask, bitboard.moves
+        ) == Solver().solve(bitboard.position, bitboard.mask, bitboard.moves)
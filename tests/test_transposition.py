@@ -0,0 +1,47 @@
+from game.bitboard import BitBoard
+from game.transposition import Bound, TranspositionTable
+
+
+def test_moves_are_stored_the_way_round_of_the_canonical_position():
+
+    bitboard, mirrored = BitBoard(), BitBoard()
+    for col in (0, 1, 1):
+        bitboard.play(col)
+        mirrored.play(6 - col)
+    table = TranspositionTable()
+
+    key, is_mirrored = bitboard.canonical_key()
+    table.put(key, 5, Bound.EXACT, 12, 3, is_mirrored)
+
+    mirrored_key, mirrored_is_mirrored = mirrored.canonical_key()
+    assert mirrored_key == key
+    assert table.get(key, is_mirrored) == (5, Bound.EXACT, 12, 3)
+    assert table.get(mirrored_key, mirrored_is_mirrored) == (5, Bound.EXACT, 12, 5)
+    assert table.peek(mirrored_key, mirrored_is_mirrored)[3] == 5
+
+
+def test_least_recently_used_entries_are_evicted():
+
+    table = TranspositionTable(max_entries=2)
+    table.put(1, 1, Bound.EXACT, 0, 1)
+    table.put(2, 1, Bound.EXACT, 0, 2)
+    table.get(1)
+    table.put(3, 1, Bound.EXACT, 0, 3)
+
+    assert len(table) == 2
+    assert table.peek(2) is None
+    assert table.peek(1) is not None
+    assert table.evictions == 1
+
+
+def test_hits_and_misses_are_counted():
+
+    table = TranspositionTable()
+    table.put(1, 1, Bound.LOWER, 0, None)
+    table.get(1)
+    table.get(2)
+    table.peek(1)
+
+    assert (table.hits, table.misses) == (1, 1)
+    table.clear()
+    assert (len(table), table.hits, table.misses) == (0, 0, 0)
@@ -0,0 +1,53 @@
+import numpy as np
+
+from game.wire import SYNC_OFFER, decode, encode
+
+
+def test_move_round_trip():
+
+    message = [
+        {
+            "type": "MV",
+            "content": 4,
+            "checksum": 0x0123456789ABCDEF,
+            "seq": 7,
+            "session": "abc",
+            "sync": SYNC_OFFER,
+        },
+        {"type": "MV", "content": None, "ack": 6, "seq": 7, "session": "abc"},
+    ]
+
+    decoded, binary = decode(encode(message))
+
+    assert binary
+    assert decoded[0] == message[0]
+    assert decoded[1]["ack"] == 6
+    assert decoded[1]["seq"] == 7
+
+
+def test_board_round_trip():
+
+    grid = np.zeros((6, 7), dtype=int)
+    grid[5] = [1, 2, 1, 2, 1, 2, 1]
+    grid[4, 3] = 2
+    grid[0, 6] = 1
+
+    decoded, _ = decode(encode([{"type": "BR", "content": grid}]))
+
+    assert decoded[0]["type"] == "BR"
+    assert np.array_equal(decoded[0]["content"], grid)
+
+
+def test_log_round_trip():
+
+    decoded, _ = decode(encode([{"type": "LG", "content": "hello"}]))
+
+    assert decoded == [{"type": "LG", "content": "hello"}]
+
+
+def test_json_messages_are_decoded_too():
+
+    decoded, binary = decode(b'[{"type": "MV", "content": 3}]')
+
+    assert not binary
+    assert decoded == [{"type": "MV", "content": 3}]